@@ -1 +1,4 @@
-from .multisort import multisort, mscol, cmp_func, reversor
\ No newline at end of file
+from .multisort import multisort, msorted, mscol, msort_topk, \
+    multisort_external, multisort_merge, cmp_func, reversor, ReversedView, \
+    SortPlan, SortStats, MultiSortedList, SortSession, multisort_argsort, \
+    apply_permutation, Columns, amultisort
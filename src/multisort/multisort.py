@@ -7,13 +7,37 @@
 # Home: https://pypi.org/project/multisort
 # Licence: MIT
 #########################################
-from functools import cmp_to_key
+import asyncio
+import os
+import pickle
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from decimal import Decimal
+from fractions import Fraction
+from functools import cmp_to_key, lru_cache, partial
+from heapq import merge, nlargest, nsmallest
+from itertools import chain, count, islice, repeat, tee
+from operator import add, attrgetter, eq, gt, is_, itemgetter, lt
+from struct import Struct
+from sys import getsizeof
+from tempfile import TemporaryDirectory
+from time import perf_counter
 from typing import Union
+try:
+    import numpy as np
+    _NP_LONG = np.dtype('l')
+except ImportError:  # optional, used by engine='numpy'
+    np = None
 cmp_func = cmp_to_key
 
 
 # multisort - Non-destructive sorter with multi column support
-# [rows] list of records to sort
+# [rows] list of records to sort, Columns for columnar data, or a
+#        pyarrow Table / RecordBatch (see _argsort_arrow)
 # [spec] list/tuple one of <key> or <spec> or list/tuple(of <spec>)
 #   items by order in tuple:
 #     [key] Key or Index for 'column' in row
@@ -22,6 +46,37 @@ cmp_func = cmp_to_key
 #     [default] Value to default if None is found or required = False (opt)
 #     [required] Will not fail if key not found (opt)
 # [reverse] reverse the sort (defaults to False)
+# [engine] sort engine (defaults to 'compiled'):
+#     'compiled': one composite key per row and a single sort pass
+#     'multipass': one stable sort pass per spec column (reference engine)
+#     'dsu': keys extracted per column once, sorts a permutation of indexes
+#     'numpy': numpy.lexsort on typed column arrays. Falls back to
+#              'compiled' for columns it can not vectorize
+#     'encoded': one order preserving bytes key per row. Falls back to
+#                'compiled' for columns it can not encode
+# [stats] SortStats instance to fill with measurements of the sort (opt)
+# [parallel] sort chunks in a pool and merge them (opt). Lists shorter
+#            than PARALLEL_MIN_ROWS are sorted in process:
+#     True or 'process': process pool. Requires a picklable spec and rows
+#     'thread': thread pool sharing rows and spec, so clean callbacks may
+#               be closures. Only used on free threaded builds (eg. 3.13t
+#               with the GIL disabled), sorted in process otherwise
+# [workers] number of workers (defaults to os.cpu_count())
+# [inplace] sort the list rows in place and return it rather than a copy
+#           (defaults to False)
+# [view] with reverse=True, return a ReversedView over the ascending result
+#        instead of a list (defaults to False)
+# [assume_runs] rows are expected to be sorted or nearly sorted
+#               (defaults to False). Checks the order in one linear scan of
+#               composite keys and returns a copy when already sorted,
+#               otherwise sorts those keys in a single pass so Timsort can
+#               merge the existing runs. Overrides engine and parallel
+# Returns: a new list, rows itself when inplace=True, or a ReversedView
+#   when view=True and reverse=True. For Columns, the reordered columns
+#   (see Columns). For Arrow data, the reordered Table / RecordBatch.
+#   reverse=True gives exactly the
+#   reverse=False result backwards; it is folded into the sort directions
+#   so no extra reversal pass or copy is made.
 # Other:
 #   mscol: Helper to simplify construction of <spec> record(s) eg:
 #     multisort(rows, [mscol('colname1', reverse=True),
@@ -31,94 +86,2465 @@ cmp_func = cmp_to_key
 #                      ('colname2', True, None, 1)]
 def multisort(rows: list,
               spec: Union[int, str, list, tuple] = None,
-              reverse: bool = False):
+              reverse: bool = False,
+              engine: str = 'compiled',
+              stats: 'SortStats' = None,
+              parallel: Union[bool, str] = False,
+              workers: int = None,
+              inplace: bool = False,
+              view: bool = False,
+              assume_runs: bool = False):
+
+    if isinstance(rows, Columns):
+        assert spec is not None, "Columns requires a spec"
+        return rows._reordered(
+            _get_plan(spec, engine).argsort(rows, reverse, stats), inplace)
+
+    if _is_arrow(rows):
+        assert spec is not None, "Arrow data requires a spec"
+        assert not inplace, "Arrow data can not be sorted in place"
+        return _argsort_arrow(_get_plan(spec, engine), rows, bool(reverse),
+                              stats, gather=True)
+
+    if inplace:
+        assert isinstance(rows, list), \
+            f"inplace=True requires a list. Got: {rows.__class__.__name__}"
+    assert parallel in (False, True, 'process', 'thread'), \
+        f"Invalid parallel. Got: {parallel!r}." \
+        " Expecting one of: False, True, 'process', 'thread'"
+
+    if reverse and view and not inplace:
+        return ReversedView(multisort(rows, spec, engine=engine, stats=stats,
+                                      parallel=parallel, workers=workers,
+                                      assume_runs=assume_runs))
 
     if spec is None:
-        _clone = rows[:]
+        _clone = rows if inplace else rows[:]
         _clone.sort(reverse=reverse)
         return _clone
 
-    rows_sorted = None
-    if isinstance(spec, (int, str)):
-        spec = [mscol(spec)]
-    for spec_c in reversed(spec):
-        spec_c_t = type(spec_c)
-        if spec_c_t in (int, str):
-            (key, col_reverse, clean, default, required) \
-                    = (spec_c, False, None, None, True)
+    plan = _get_plan(spec, engine)
+    if parallel and not assume_runs and not (stats is not None
+                                             and stats.profile):
+        if not isinstance(rows, (list, tuple)):  # eg. a generator
+            rows = list(rows)
+        rows_sorted = _sort_parallel(plan, rows, workers, stats,
+                                     parallel == 'thread')
+        if rows_sorted is not None:
+            if reverse:
+                rows_sorted.reverse()
+            if inplace:
+                rows[:] = rows_sorted
+                return rows
+            return rows_sorted
+
+    if inplace:
+        plan.sort(rows, reverse=reverse, stats=stats, assume_runs=assume_runs)
+        return rows
+
+    return plan.sorted(rows, reverse=reverse, stats=stats,
+                       assume_runs=assume_runs)
+
+
+# msorted - sorted() style multi column sort with column options in a dict
+# None sorts last in every column, reversed ones included.
+# [rows] list of records or any iterable of records (eg. a generator).
+#        Lists and tuples are left untouched. Other iterables are read into
+#        the one list that is then sorted in place, as sorted() does
+# [spec] one of <key> or (<key>, <options>) or list/tuple of them
+#   [key] Key or Index for 'column' in row
+#   [options] dict with any of:
+#     'reverse': reversed sort of the column (defaults to False)
+#     'clean': callback to clean / alter data in 'field'
+#     'default': Value to default if None is found or required = False
+#     'required': Will not fail if key not found (defaults to True)
+# [reverse] reverse the direction of every column (defaults to False).
+#           As with sorted(), ties keep their input order
+# The options are turned into a spec and compiled into a cached SortPlan, so
+# repeated calls with the same spec reuse the compiled key.
+# Returns: a new list
+# eg:
+#   msorted(rows, [('grade', {'reverse': True, 'clean': clean_grade}),
+#                  ('attend', {'reverse': False})])
+def msorted(rows, spec=None, reverse: bool = False) -> list:
+    if spec is None:
+        return sorted(rows, reverse=reverse)
+    return _get_plan(_msorted_spec(spec, bool(reverse)), 'compiled',
+                     True).sorted(rows)
+
+
+_MSORTED_OPTIONS = ('reverse', 'clean', 'default', 'required')
+
+
+# _msorted_spec - msorted() spec as a tuple of full 5 value <spec> tuples
+def _msorted_spec(spec, reverse) -> tuple:
+    if isinstance(spec, (int, str)) \
+            or (isinstance(spec, tuple) and len(spec) == 2
+                and isinstance(spec[1], dict)):
+        spec = (spec,)
+    cols = []
+    for spec_c in spec:
+        if isinstance(spec_c, (int, str)):
+            cols.append((spec_c, reverse, None, None, True))
+            continue
+        assert isinstance(spec_c, (list, tuple)) and len(spec_c) in (1, 2), \
+            "Invalid spec. Expecting <key> or (<key>, <options>)." \
+            f" Got: {spec_c!r}"
+        opts = spec_c[1] if len(spec_c) == 2 else {}
+        assert isinstance(opts, dict), \
+            "Invalid spec. Options must be a dict." \
+            f" Got: {opts.__class__.__name__}"
+        unknown = set(opts).difference(_MSORTED_OPTIONS)
+        assert not unknown, \
+            f"Invalid spec option(s): {sorted(map(str, unknown))}." \
+            f" Expecting any of: {_MSORTED_OPTIONS}"
+        cols.append((spec_c[0], bool(opts.get('reverse')) != reverse,
+                     opts.get('clean'), opts.get('default'),
+                     opts.get('required', True)))
+    return tuple(cols)
+
+
+# amultisort - multisort() for asyncio event loops
+# Picks how to sort by the number of rows so the loop is not blocked:
+#   under inline_rows: sorted inline, avoiding the executor hop
+#   under offload_rows: sorted cooperatively in chunks of chunk_rows,
+#     yielding to the loop between chunks and while merging them
+#   otherwise: sorted by multisort() in executor
+# The result is the same list as multisort(rows, spec, reverse, engine).
+# [rows] list of records or any iterable of records
+# [spec] same as multisort() spec
+# [reverse] same as multisort() reverse
+# [executor] concurrent.futures executor for large sorts (defaults to the
+#            loop's default thread pool). A ProcessPoolExecutor sorts in
+#            parallel with the loop but requires picklable rows and spec
+# [engine] same as multisort() engine. Chunked sorts use 'compiled'
+# [inline_rows] defaults to ASYNC_INLINE_ROWS
+# [offload_rows] defaults to ASYNC_OFFLOAD_ROWS
+# [chunk_rows] defaults to ASYNC_CHUNK_ROWS
+# eg:
+#   async def handler(request):
+#       rows_sorted = await amultisort(rows, [mscol('grade', reverse=True),
+#                                             'attend'])
+async def amultisort(rows, spec: Union[int, str, list, tuple] = None,
+                     reverse: bool = False, executor=None,
+                     engine: str = 'compiled', inline_rows: int = None,
+                     offload_rows: int = None, chunk_rows: int = None):
+    inline_rows = ASYNC_INLINE_ROWS if inline_rows is None else inline_rows
+    offload_rows = ASYNC_OFFLOAD_ROWS if offload_rows is None \
+        else offload_rows
+    chunk_rows = ASYNC_CHUNK_ROWS if chunk_rows is None else chunk_rows
+    assert chunk_rows > 0, f"Invalid chunk_rows. Got: {chunk_rows}"
+    if not isinstance(rows, (list, tuple)):
+        rows = list(rows)
+
+    n = len(rows)
+    if n < inline_rows:
+        return multisort(rows, spec, reverse=reverse, engine=engine)
+
+    if n < offload_rows:
+        try:
+            return await _asort_chunked(rows, spec, bool(reverse),
+                                        chunk_rows)
+        except Exception:
+            # Re-run multisort() so the error is reported as it would be
+            return multisort(rows, spec, reverse=reverse, engine=engine)
+
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, partial(multisort, rows, spec, reverse=reverse,
+                          engine=engine))
+
+
+# _asort_chunked - Sort chunks with their keys, then merge the runs, yielding
+#                  to the event loop after each chunk_rows rows of work.
+#                  Ties resolve as in _external_sort
+async def _asort_chunked(rows, spec, reverse, chunk_rows) -> list:
+    if spec is None:
+        # same as list.sort(reverse=reverse), which keeps ties in order
+        (key, merge_reverse, flip) = (None, reverse, False)
+    else:
+        plan = _get_plan(spec)
+        key = plan.keys(rows)[0]
+        (merge_reverse, flip) = (plan.reverse != reverse, reverse)
+
+    runs = []
+    for i in range(0, len(rows), chunk_rows):
+        chunk = rows[i:i + chunk_rows]
+        keys = chunk if key is None else list(map(key, chunk))
+        idxs = range(len(chunk))
+        idxs = sorted(idxs[::-1] if flip else idxs, key=keys.__getitem__,
+                      reverse=merge_reverse)
+        runs.append(list(zip(map(keys.__getitem__, idxs),
+                             map(chunk.__getitem__, idxs))))
+        await asyncio.sleep(0)
+    if flip:
+        runs.reverse()
+
+    rows_sorted = []
+    merged = merge(*runs, key=itemgetter(0), reverse=merge_reverse)
+    while True:
+        block = list(islice(merged, chunk_rows))
+        rows_sorted.extend(map(itemgetter(1), block))
+        if len(block) < chunk_rows:
+            return rows_sorted
+        await asyncio.sleep(0)
+
+
+# msort_topk - First k rows of a multisort without sorting all rows
+# Uses heap selection, O(n log k), with ties kept in input order so the
+# result is exactly multisort(rows, spec, reverse)[offset:offset + k]
+# [rows] list of records or any iterable of records
+# [spec] same as multisort() spec
+# [k] number of rows to return
+# [offset] number of leading rows to skip (eg. for paging)
+# [reverse] same as multisort() reverse
+# eg. page 3 of 50 rows:
+#   msort_topk(rows, spec, 50, offset=100)
+def msort_topk(rows, spec: Union[int, str, list, tuple], k: int,
+               offset: int = 0, reverse: bool = False) -> list:
+    assert k >= 0 and offset >= 0, \
+        f"Invalid k or offset. Got: k={k}, offset={offset}"
+    n = offset + k
+    if k == 0:
+        return []
+
+    plan = _get_plan(spec)
+    is_seq = isinstance(rows, (list, tuple))
+    # one-shot iterables can not be scanned for row type first
+    (key, col_keys, _) = (plan.keys(rows) if is_seq
+                          else plan.keys_for_type(None))
+    try:
+        if not reverse:
+            heap_f = nlargest if plan.reverse else nsmallest
+            return heap_f(n, rows, key=key)[offset:]
+
+        # Result is the tail of the forward sort reversed, so ties must
+        # come out in reverse input order
+        (rows_k, rows_v) = (rows, rows) if is_seq else tee(rows)
+        if plan.reverse:
+            decorated = zip(map(key, rows_k), count(0, -1), rows_v)
+            top = nsmallest(n, decorated)
         else:
-            assert spec_c_t in (list, tuple), \
-                    f"Invalid spec. Got: {spec_c_t.__name__}. See docs"
-            if len(spec_c) < 5:
-                spec_c = mscol(*spec_c)
-            (key, col_reverse, clean, default, required) = spec_c
+            decorated = zip(map(key, rows_k), count(), rows_v)
+            top = nlargest(n, decorated)
+        return [row for (_, _, row) in top[offset:]]
+
+    except MultiSortError:
+        raise
+    except Exception as ex:
+        if not is_seq:
+            # Rows already consumed can not be sorted again
+            if isinstance(ex, MultiSortBaseExc):
+                raise _col_error(ex, col_keys) from None
+            raise
+        # Re-run a full sort so the error is reported the same way
+        return list(plan.sorted(rows, reverse=reverse))[offset:n]
+
+
+# multisort_argsort - Stable sorted order of rows as row indexes
+# Same order as multisort(), without building the sorted rows. Use with
+# apply_permutation() to reorder parallel lists.
+# [rows] list of records, any iterable of records, Columns or a pyarrow
+#        Table / RecordBatch
+# [spec] same as multisort() spec
+# [reverse] same as multisort() reverse
+# [engine] same as multisort() engine
+# [as_numpy] return a numpy intp array (requires numpy)
+# [stats] same as multisort() stats
+# Returns: array('l') of row indexes, or a numpy array when as_numpy=True.
+#   For Arrow data, the pyarrow UInt64Array of indexes (eg. for
+#   table.take()), or a numpy array when as_numpy=True
+# eg:
+#   order = multisort_argsort(rows, [mscol('grade', reverse=True), 'attend'])
+#   (names, scores) = apply_permutation(order, names, scores)
+def multisort_argsort(rows, spec: Union[int, str, list, tuple],
+                      reverse: bool = False, engine: str = 'compiled',
+                      as_numpy: bool = False, stats: 'SortStats' = None):
+    if as_numpy and np is None:
+        raise ImportError("as_numpy=True requires numpy."
+                          " Install with: pip install multisort[numpy]")
+
+    idxs = _get_plan(spec, engine).argsort(rows, reverse=reverse,
+                                           stats=stats)
+    if as_numpy:
+        return np.asarray(idxs, dtype=np.intp)
+    if _is_arrow(idxs):
+        return idxs
+    if np is not None and isinstance(idxs, np.ndarray):
+        return array('l', idxs.astype(_NP_LONG).tobytes())
+    return array('l', idxs)
+
+
+# apply_permutation - Reorder parallel sequences by a permutation
+# [perm] row indexes, eg. from multisort_argsort()
+# [seqs] sequences of the same length as perm. numpy arrays are reordered
+#        with numpy indexing, array.array keeps its typecode and any other
+#        sequence gives a list
+# [inplace] reorder lists and arrays in place (defaults to False)
+# Returns: tuple of the reordered sequences, in the order given
+# eg:
+#   (names, scores) = apply_permutation(order, names, scores)
+def apply_permutation(perm, *seqs, inplace: bool = False) -> tuple:
+    n = len(perm)
+    perm_list = perm.tolist() if np is not None \
+        and isinstance(perm, np.ndarray) else perm
+    out = []
+    for seq in seqs:
+        assert len(seq) == n, \
+            f"Sequence length {len(seq)} does not match permutation {n}"
+        if np is not None and isinstance(seq, np.ndarray):
+            seq_new = seq[np.asarray(perm, dtype=np.intp)]
+        elif isinstance(seq, array):
+            seq_new = array(seq.typecode, map(seq.__getitem__, perm_list))
+        else:
+            seq_new = list(map(seq.__getitem__, perm_list))
+        if inplace:
+            seq[:] = seq_new
+            seq_new = seq
+        out.append(seq_new)
+    return tuple(out)
+
+
+# multisort_external - Sort rows that do not fit in memory
+# Sorts chunks of chunk_size rows in memory, spills each sorted chunk to a
+# temp file and k-way merges the files. Returns a generator of sorted rows.
+# Rows must be picklable.
+# [rows] any iterable of records
+# [spec] same as multisort() spec
+# [reverse] same as multisort() reverse
+# [chunk_size] rows sorted in memory at a time
+# [tmp_dir] directory for temp files (defaults to the system temp dir)
+# [fan_in] max files merged at once. More runs are merged in several levels
+# eg:
+#   with open('export.csv') as f:
+#       for row in multisort_external(csv.DictReader(f), ['zip', 'name']):
+#           ...
+def multisort_external(rows, spec: Union[int, str, list, tuple],
+                       reverse: bool = False, chunk_size: int = 100_000,
+                       tmp_dir: str = None, fan_in: int = 64):
+    assert chunk_size > 0, f"Invalid chunk_size. Got: {chunk_size}"
+    assert fan_in > 1, f"Invalid fan_in. Got: {fan_in}"
+    return _external_sort(iter(rows), _get_plan(spec), reverse, chunk_size,
+                          tmp_dir, fan_in)
+
+
+def _external_sort(it, plan, reverse, chunk_size, tmp_dir, fan_in):
+    chunk = list(islice(it, chunk_size))
+    chunk_next = list(islice(it, chunk_size))
+    if not chunk_next:  # fits in memory
+        plan.sort(chunk, reverse=reverse)
+        yield from chunk
+        return
 
-        def _sort_column(row):  # Throws MSIndexError, MSKeyError
-            ex1 = None
+    tmp = TemporaryDirectory(prefix='multisort_', dir=tmp_dir)
+    try:
+        runs = []
+        row_types = set()
+        while chunk:
+            row_types.update(map(type, chunk))
+            plan.sort(chunk, reverse=reverse)
+            runs.append(_spill(chunk, tmp.name, len(runs)))
+            if chunk_next is not None:
+                (chunk, chunk_next) = (chunk_next, None)
+            else:
+                chunk = list(islice(it, chunk_size))
+
+        key = plan.keys_for_type(
+            row_types.pop() if len(row_types) == 1 else None)[0]
+        # Reversed output is the forward order backwards, so merge the
+        # other way and let later runs win ties
+        merge_reverse = plan.reverse != bool(reverse)
+        if reverse:
+            runs.reverse()
+
+        run_no = len(runs)
+        while len(runs) > fan_in:
+            runs_next = []
+            for i in range(0, len(runs), fan_in):
+                group = runs[i:i + fan_in]
+                runs_next.append(_spill(
+                    merge(*map(_unspill, group), key=key,
+                          reverse=merge_reverse),
+                    tmp.name, run_no))
+                run_no += 1
+                for path in group:
+                    os.remove(path)
+            runs = runs_next
+
+        yield from merge(*map(_unspill, runs), key=key,
+                         reverse=merge_reverse)
+    finally:
+        tmp.cleanup()
+
+
+_SPILL_BLOCK = 1024
+
+
+def _spill(rows, dir_name, run_no) -> str:
+    path = os.path.join(dir_name, f"run_{run_no}.pkl")
+    rows = iter(rows)
+    with open(path, 'wb') as f:
+        pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+        block = list(islice(rows, _SPILL_BLOCK))
+        while block:
+            pickler.dump(block)
+            pickler.clear_memo()
+            block = list(islice(rows, _SPILL_BLOCK))
+    return path
+
+
+def _unspill(path):
+    with open(path, 'rb') as f:
+        unpickler = pickle.Unpickler(f)
+        while True:
             try:
-                try:
-                    v = row[key]
-                except Exception as ex:
-                    ex1 = ex
-                    v = getattr(row, key)
-            except Exception as ex2:
-                if isinstance(row, (list, tuple)):  # failfast for tuple / list
-                    raise MSIndexError(ex1.args[0], row, ex1)
+                block = unpickler.load()
+            except EOFError:
+                return
+            yield from block
+
+
+# multisort_merge - Lazily merge inputs that are each already sorted with
+# the same spec, without re-sorting. Returns a generator of rows in the
+# same order as multisort() of all inputs concatenated, so rows with equal
+# keys come out in input order
+# [iterables] lists or iterables of rows, each already sorted by
+#             multisort(rows, spec, reverse=reverse)
+# [spec] same as multisort() spec
+# [reverse] same as multisort() reverse. The inputs must have been sorted
+#           with the same reverse
+# [validate] check that every input really is sorted and raise a
+#            MultiSortError naming the first row out of order
+#            (defaults to False)
+# eg:
+#   for row in multisort_merge(shard_a, shard_b, spec=['zip', 'name']):
+#       ...
+def multisort_merge(*iterables, spec: Union[int, str, list, tuple],
+                    reverse: bool = False, validate: bool = False):
+    return _merge_sorted(iterables, _get_plan(spec), bool(reverse), validate)
+
+
+def _merge_sorted(iterables, plan, reverse, validate):
+    (key, col_keys, _) = plan.keys_for_type(None)
+    # Same as _external_sort: a reversed result is the forward order
+    # backwards, so later inputs win ties
+    merge_reverse = plan.reverse != reverse
+    inputs = list(enumerate(iterables))
+    if reverse:
+        inputs.reverse()
+    try:
+        if not validate:
+            yield from merge(*(rows for (_, rows) in inputs), key=key,
+                             reverse=merge_reverse)
+            return
+
+        yield from map(itemgetter(1), merge(
+            *(_check_sorted(rows, key, merge_reverse, n)
+              for (n, rows) in inputs),
+            key=itemgetter(0), reverse=merge_reverse))
+    except MultiSortError:
+        raise
+    except MultiSortBaseExc as ex:
+        raise _col_error(ex, col_keys) from None
+
+
+# _col_error - Error for a failed composite key, reported on the column
+#              as multisort() would
+# [ex] MSKeyError / MSIndexError raised for ex.row
+# [col_keys] the plan's per column keys
+def _col_error(ex, col_keys):
+    for (col, _, col_key) in col_keys:
+        try:
+            col_key(ex.row)
+        except MultiSortBaseExc as ex_col:
+            return _sort_error(ex_col, col)
+    return ex
+
+
+# _check_sorted - Yield (key, row) for rows, raising a MultiSortError at
+#                 the first row out of order
+def _check_sorted(rows, key, desc, n):
+    key_prev = None
+    for (i, row) in enumerate(rows):
+        k = key(row)
+        if i and (k > key_prev if desc else k < key_prev):
+            raise MultiSortError(
+                f"Input {n} is not sorted by spec. Row {i} is out of"
+                f" order. Row: {row}", row, None)
+        key_prev = k
+        yield (k, row)
+
+
+ENGINES = ('compiled', 'multipass', 'dsu', 'numpy', 'encoded')
+PLAN_CACHE_SIZE = 128
+PARALLEL_MIN_ROWS = 100_000
+SESSION_MAX_BYTES = 256 * 1024 * 1024
+ASYNC_INLINE_ROWS = 10_000
+ASYNC_OFFLOAD_ROWS = 200_000
+ASYNC_CHUNK_ROWS = 10_000
+
 
-                elif required:
-                    raise MSKeyError(ex2.args[0], row, ex2)
+# SortPlan - Spec compiled once for reuse across many sorts
+# [spec] same as multisort() spec
+# [engine] same as multisort() engine
+# [none_last] None sorts last in reversed columns too, as msorted() does
+#             (defaults to False). 'compiled' and 'multipass' engines only
+# Methods:
+#   sorted(rows, reverse=False, stats=None): Non-destructive sort.
+#       Same as multisort()
+#   sort(rows, reverse=False, stats=None): Sorts list rows in place
+#   argsort(rows, reverse=False, stats=None): Sorted order as a list of row
+#       indexes (a numpy array for the numpy engine)
+# eg:
+#   plan = SortPlan([mscol('grade', reverse=True), 'attend'])
+#   for rows in result_sets:
+#       rows_sorted = plan.sorted(rows)
+class SortPlan:
+    __slots__ = ('spec', 'engine', 'cols', 'reverse', 'none_last',
+                 '_shapes')
 
+    def __init__(self, spec: Union[int, str, list, tuple],
+                 engine: str = 'compiled', none_last: bool = False):
+        assert engine in ENGINES, \
+            f"Invalid engine. Got: {engine}. Expecting one of: {ENGINES}"
+        assert not none_last or engine in ('compiled', 'multipass'), \
+            f"none_last requires the compiled or multipass engine." \
+            f" Got: {engine}"
+        self.spec = spec
+        self.engine = engine
+        self.cols = tuple(_norm_spec(spec))
+        self.reverse = bool(self.cols[0][1])
+        self.none_last = none_last
+        self._shapes = {}
+
+    # keys - Return (key, col_keys, getters) specialized for the row type
+    #        of rows
+    #   key: composite key for the compiled engine
+    #   col_keys: tuple of (key, reverse, key_func) for the multipass engine
+    #   getters: tuple of (get, get_safe) value getters for the dsu engine
+    # Rows of mixed types get the generic item-then-attribute lookup
+    def keys(self, rows) -> tuple:
+        row_types = set(map(type, rows))
+        return self.keys_for_type(
+            row_types.pop() if len(row_types) == 1 else None)
+
+    # keys_for_type - Same as keys() for rows all of type row_t
+    #                 (None for mixed types)
+    def keys_for_type(self, row_t) -> tuple:
+        try:
+            return self._shapes[row_t]
+        except KeyError:
+            pass
+        keys = (_compile_key(self.cols, row_t, self.none_last),
+                tuple((key, col_reverse,
+                       _col_key(key, clean, default, required, row_t=row_t,
+                                nones_first=self._nones_first(
+                                    col_reverse)))
+                      for (key, col_reverse, clean, default, required)
+                      in self.cols),
+                tuple(_col_getter(key, default, required, row_t)
+                      for (key, _, _, default, required) in self.cols))
+        self._shapes[row_t] = keys
+        return keys
+
+    # _nones_first - nones_first of _col_key() for a column sorted in its
+    #                own direction (multipass). None for the default
+    def _nones_first(self, col_reverse):
+        return True if self.none_last and col_reverse else None
+
+    def sorted(self, rows, reverse: bool = False,
+               stats: 'SortStats' = None, assume_runs: bool = False) -> list:
+        if not isinstance(rows, (list, tuple)):
+            rows = list(rows)
+            self.sort(rows, reverse=reverse, stats=stats,
+                      assume_runs=assume_runs)
+            return rows
+
+        return self._sort(rows, False, bool(reverse), stats, assume_runs)
+
+    def sort(self, rows: list, reverse: bool = False,
+             stats: 'SortStats' = None, assume_runs: bool = False):
+        self._sort(rows, True, bool(reverse), stats, assume_runs)
+
+    def argsort(self, rows, reverse: bool = False,
+                stats: 'SortStats' = None):
+        if isinstance(rows, Columns):
+            return _argsort_columns(self, rows, bool(reverse), stats)
+        if _is_arrow(rows):
+            return _argsort_arrow(self, rows, bool(reverse), stats)
+        if not isinstance(rows, (list, tuple)):
+            rows = list(rows)
+        return self._sort(rows, False, bool(reverse), stats, gather=False)
+
+    # _sort - Sort with the plan's engine
+    # [flip] reverse the whole result. Rather than reversing afterwards,
+    #        rows are read backwards and every column direction flipped,
+    #        which is the same order as the stable sort reversed
+    # [assume_runs] see multisort()
+    # [gather] False to return the permutation of row indexes instead
+    def _sort(self, rows, inplace, flip, stats, assume_runs=False,
+              gather=True):
+        if stats is not None:
+            stats._start('compiled' if assume_runs else self.engine,
+                         len(rows))
+            t0 = perf_counter()
+            if stats.profile:
+                return _sort_profiled(self, rows, inplace, flip, stats,
+                                      gather, t0)
+
+        (key, col_keys, getters) = self.keys(rows)
+        if self.engine == 'multipass' and not assume_runs:
+            rows_sorted = _sort_multipass(rows, col_keys, inplace, flip) \
+                if gather else _argsort_multipass(rows, col_keys, flip)
+        else:
+            try:
+                rows_sorted = None
+                if assume_runs:
+                    rows_sorted = _sort_runs(rows, key, self.reverse != flip,
+                                             inplace, flip, stats)
+
+                elif self.engine == 'numpy':
+                    (rows_sorted, fallback) = _sort_numpy(
+                        rows, self.cols, getters, inplace, flip, gather)
+                    if rows_sorted is None and stats is not None:
+                        stats.engine = 'compiled'
+                        stats.fallback = fallback
+
+                elif self.engine == 'encoded':
+                    (rows_sorted, fallback) = _sort_encoded(
+                        rows, self.cols, getters, inplace, stats, flip,
+                        gather)
+                    if rows_sorted is None and stats is not None:
+                        stats.engine = 'compiled'
+                        stats.fallback = fallback
+
+                if rows_sorted is not None:
+                    pass
+                elif self.engine == 'dsu':
+                    rows_sorted = _sort_dsu(rows, self.cols, self.reverse,
+                                            getters, inplace, stats, flip,
+                                            gather=gather)
+                elif not gather:
+                    keys = list(map(key, rows))
+                    idxs = range(len(rows))
+                    rows_sorted = sorted(idxs[::-1] if flip else idxs,
+                                         key=keys.__getitem__,
+                                         reverse=self.reverse != flip)
+                elif inplace:
+                    if flip:
+                        rows.reverse()
+                    rows.sort(key=key, reverse=self.reverse != flip)
+                    rows_sorted = rows
                 else:
-                    if default is None:
-                        v = None
-                    else:
-                        v = default
+                    rows_sorted = sorted(reversed(rows) if flip else rows,
+                                         key=key,
+                                         reverse=self.reverse != flip)
+            except Exception:
+                # Re-run the reference engine so that errors are reported
+                # exactly as they would be column by column
+                rows_sorted = _sort_multipass(rows, col_keys, inplace, flip) \
+                    if gather else _argsort_multipass(rows, col_keys, flip)
+
+        if stats is not None:
+            stats._done(t0)
+        return rows_sorted
+
+    def __repr__(self):
+        return f"<SortPlan> engine: {self.engine}, spec: {self.cols}" \
+            + (", none_last" if self.none_last else "")
+
+
+# SortStats - Optional measurements filled in by a sort when passed as stats
+#   engine: engine used
+#   rows: number of rows sorted
+#   total_secs: total time of the sort
+#   (dsu engine only)
+#   extract_secs: time extracting column values from rows
+#   clean_secs: time building keys for columns with a clean callback
+#   sort_secs: time sorting the index permutation
+#   gather_secs: time building the sorted rows from the permutation
+#   key_bytes: approx. memory held by the keys and the permutation
+#   (encoded engine only, with extract, sort, gather and key_bytes as above)
+#   encode_secs: time encoding column values to bytes
+#   (Arrow data only, with extract, sort and gather as above)
+#   convert_secs: time converting Arrow columns to Python lists when the
+#                 spec falls back to a Python sort
+#   (assume_runs=True only)
+#   presorted: rows were already in order, so no sort was run
+#   sorted_prefix: number of leading rows already in order
+#   inversions: number of adjacent rows found out of order
+#   fallback: why the requested engine was not used (eg. numpy not installed)
+#   (profile=True only, see below)
+#   passes: number of sort passes
+#   key_calls: number of key function calls
+#   clean_calls: number of clean callback calls. clean_secs is the time
+#                spent inside clean callbacks
+#   lookup_fallbacks: lookups where the fast getter for the row type failed
+#                     and the generic lookup was used
+#   attr_lookups: lookups where row[key] raised and getattr(row, key) was
+#                 tried
+#   defaults: missing keys given the default (required=False)
+#   errors: lookup or clean exceptions raised out of the sort
+#   columns: per column dicts of key, reverse, secs (time of its pass) and
+#            the counters above
+# [profile] instrument the sort (defaults to False). The sort is run by the
+#           multipass engine, one timed pass per column, with counting key
+#           functions. The order is identical, only slower. Applies to
+#           multisort() and SortPlan (parallel is ignored); without it no
+#           instrumentation code runs
+# [callback] called with this SortStats after each sort, eg. to export it
+#            to a metrics pipeline (opt)
+# eg:
+#   stats = SortStats()
+#   multisort(rows, spec, engine='dsu', stats=stats)
+#   print(stats.as_dict())
+#   # find where the time goes and send it on:
+#   stats = SortStats(profile=True,
+#                     callback=lambda s: statsd_gauges(s.as_metrics()))
+#   multisort(rows, spec, stats=stats)
+class SortStats:
+    def __init__(self, profile: bool = False, callback=None):
+        self._profile = profile
+        self._callback = callback
+        self._handoff = None
+        self._reset()
+
+    # _reset - Clear every measurement
+    def _reset(self):
+        self.engine = None
+        self.rows = 0
+        self.total_secs = 0.0
+        self.extract_secs = 0.0
+        self.clean_secs = 0.0
+        self.encode_secs = 0.0
+        self.convert_secs = 0.0
+        self.sort_secs = 0.0
+        self.gather_secs = 0.0
+        self.key_bytes = 0
+        self.presorted = False
+        self.sorted_prefix = 0
+        self.inversions = 0
+        self.fallback = None
+        if self._profile:
+            self.passes = 0
+            self.key_calls = 0
+            self.clean_calls = 0
+            self.lookup_fallbacks = 0
+            self.attr_lookups = 0
+            self.defaults = 0
+            self.errors = 0
+            self.columns = []
+
+    @property
+    def profile(self) -> bool:
+        return self._profile
+
+    def as_dict(self) -> dict:
+        return {k: v for (k, v) in self.__dict__.items() if k[0] != '_'}
 
+    # as_metrics - Flat {name: number} of the measurements, eg:
+    #   {'multisort.rows': 1000, 'multisort.total_secs': 0.0012, ...,
+    #    'multisort.col.grade.secs': 0.0004, ...}
+    #   Columns are named by key. Non numeric fields are left out
+    def as_metrics(self, prefix: str = 'multisort') -> dict:
+        metrics = {}
+        for (name, v) in self.as_dict().items():
+            if isinstance(v, (int, float)):
+                metrics[f"{prefix}.{name}"] = v
+        for col in getattr(self, 'columns', ()):
+            for (name, v) in col.items():
+                if name not in ('key', 'reverse'):
+                    metrics[f"{prefix}.col.{col['key']}.{name}"] = v
+        return metrics
+
+    # _start - Clear the measurements of any earlier sort as a sort starts
+    #          with engine on rows rows. Keeps a fallback recorded by a
+    #          caller that handed the sort on (see _sort_parallel)
+    def _start(self, engine, rows):
+        fallback = self._handoff
+        self._reset()
+        self.engine = engine
+        self.rows = rows
+        self.fallback = fallback
+        self._handoff = None
+
+    # _done - Record the total time since t0 and notify the callback
+    def _done(self, t0):
+        self.total_secs = perf_counter() - t0
+        if self._callback is not None:
+            self._callback(self)
+
+    def __repr__(self):
+        return f"<SortStats> {self.as_dict()}"
+
+
+# ReversedView - Read only view of a sequence in reverse order
+# Supports len(), indexing, slicing, iteration and reversed() without
+# copying the sequence. Slices return lists of the selected rows only.
+# eg:
+#   rows_sorted = multisort(rows, spec)
+#   rows_desc = ReversedView(rows_sorted)
+class ReversedView(Sequence):
+    __slots__ = ('_seq',)
+
+    def __init__(self, seq):
+        self._seq = seq
+
+    def __len__(self):
+        return len(self._seq)
+
+    def __getitem__(self, i):
+        n = len(self._seq)
+        if isinstance(i, slice):
+            return list(map(self._seq.__getitem__, range(n - 1, -1, -1)[i]))
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("ReversedView index out of range")
+        return self._seq[n - 1 - i]
+
+    def __iter__(self):
+        return reversed(self._seq)
+
+    def __reversed__(self):
+        return iter(self._seq)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(map(eq, self, other))
+
+    def __repr__(self):
+        return f"<ReversedView> {list(self)}"
+
+
+# MultiSortedList - Sorted container that keeps multisort order as rows are
+# added and removed, without re-sorting
+# Rows are held in chunks of about load rows next to their cached composite
+# keys, and placed by binary search on the keys, so an add costs
+# O(log n + load) rather than a full O(n log n) sort. Rows with equal keys
+# stay in insertion order, so iteration always matches
+# multisort(rows, spec) for the same rows added in the same order.
+# Rows must not be changed in place while in the list. Use update() to
+# replace a row.
+# [spec] same as multisort() spec
+# [rows] initial rows (opt)
+# [load] target chunk size (defaults to 1000)
+# Methods:
+#   add(row): Insert one row
+#   bulk_add(rows): Insert many rows. Merges by re-sorting when the batch is
+#       large relative to the list
+#   remove(row): Remove the first row equal to row. ValueError if missing
+#   update(row, new_row): Replace row with new_row
+#   clear(): Remove all rows
+# eg:
+#   live = MultiSortedList([mscol('grade', reverse=True), 'attend'], rows)
+#   live.bulk_add(new_rows)
+#   top = live[:10]
+class MultiSortedList(Sequence):
+    __slots__ = ('spec', '_plan', '_load', '_len', '_rows', '_keys',
+                 '_maxes', '_key_fns')
+
+    def __init__(self, spec: Union[int, str, list, tuple], rows=None,
+                 load: int = 1000):
+        assert load > 1, f"Invalid load. Got: {load}"
+        self.spec = spec
+        self._plan = _get_plan(spec)
+        self._load = load
+        self._key_fns = {}
+        self.clear()
+        if rows is not None:
+            self.bulk_add(rows)
+
+    def clear(self):
+        self._len = 0
+        self._rows = []  # chunks of rows
+        self._keys = []  # chunks of keys, parallel to _rows
+        self._maxes = []  # last key of each chunk
+
+    def add(self, row):
+        key = self._key(row, (row,))
+        if not self._rows:
+            self._rows.append([row])
+            self._keys.append([key])
+            self._maxes.append(key)
+            self._len = 1
+            return
+
+        desc = self._plan.reverse
+        try:
+            c = _bisect_right(self._maxes, key, desc)
+            if c == len(self._maxes):
+                c -= 1
+            keys = self._keys[c]
+            i = _bisect_right(keys, key, desc)
+        except Exception as ex:
+            self._raise_error(ex, (row,))
+        keys.insert(i, key)
+        self._rows[c].insert(i, row)
+        if i == len(keys) - 1:
+            self._maxes[c] = key
+        self._len += 1
+        if len(keys) > self._load * 2:
+            self._split(c)
+
+    def bulk_add(self, rows):
+        rows = list(rows)
+        if len(rows) * 16 < self._len:
+            for row in rows:
+                self.add(row)
+            return
+        if not rows:
+            return
+
+        # Existing rows are one sorted run, so Timsort merges them with the
+        # new rows in about O(n + m log m) and ties keep insertion order
+        keys_new = list(map(self._key_of, rows))
+        rows_all = list(chain.from_iterable(self._rows)) + rows
+        keys_all = list(chain.from_iterable(self._keys)) + keys_new
+        try:
+            order = sorted(range(len(keys_all)), key=keys_all.__getitem__,
+                           reverse=self._plan.reverse)
+        except Exception as ex:
+            self._raise_error(ex, rows_all)
+        rows_all = list(map(rows_all.__getitem__, order))
+        keys_all = list(map(keys_all.__getitem__, order))
+
+        load = self._load
+        self._rows = [rows_all[i:i + load]
+                      for i in range(0, len(rows_all), load)]
+        self._keys = [keys_all[i:i + load]
+                      for i in range(0, len(keys_all), load)]
+        self._maxes = [keys[-1] for keys in self._keys]
+        self._len = len(rows_all)
+
+    def remove(self, row):
+        (c, i) = self._find(row)
+        if c is None:
+            raise ValueError(f"MultiSortedList.remove(row): row not found."
+                             f" Got: {row!r}")
+        keys = self._keys[c]
+        del keys[i]
+        del self._rows[c][i]
+        self._len -= 1
+        if not keys:
+            del self._keys[c], self._rows[c], self._maxes[c]
+        elif i == len(keys):
+            self._maxes[c] = keys[-1]
+
+    def update(self, row, new_row):
+        self.remove(row)
+        self.add(new_row)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return chain.from_iterable(self._rows)
+
+    def __reversed__(self):
+        return chain.from_iterable(map(reversed, reversed(self._rows)))
+
+    def __contains__(self, row):
+        return self._find(row)[0] is not None
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._slice(*i.indices(self._len))
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("MultiSortedList index out of range")
+        for rows in self._rows:
+            if i < len(rows):
+                return rows[i]
+            i -= len(rows)
+
+    # _slice - Rows start:stop:step, reading only the chunks they are in
+    def _slice(self, start, stop, step):
+        if step < 0:  # the forward slice of the same rows, reversed
+            n = len(range(start, stop, step))
+            if not n:
+                return []
+            rows_sl = self._slice(start + (n - 1) * step, start + 1, -step)
+            rows_sl.reverse()
+            return rows_sl
+        if stop <= start:
+            return []
+        c = 0
+        for rows in self._rows:
+            if start < len(rows):
+                break
+            start -= len(rows)
+            stop -= len(rows)
+            c += 1
+        return list(islice(chain.from_iterable(islice(self._rows, c, None)),
+                           start, stop, step))
+
+    def __repr__(self):
+        return f"<MultiSortedList> {list(self)}"
+
+    # _key - Composite key for row, as multisort() would report errors
+    def _key(self, row, rows):
+        try:
+            return self._key_of(row)
+        except Exception as ex:
+            self._raise_error(ex, rows)
+
+    def _key_of(self, row):
+        row_t = type(row)
+        try:
+            key_fn = self._key_fns[row_t]
+        except KeyError:
+            key_fn = self._key_fns[row_t] = \
+                self._plan.keys_for_type(row_t)[0]
+        return key_fn(row)
+
+    # _raise_error - Re-run a sort of the rows involved so that the error
+    #                is reported as multisort() would report it
+    def _raise_error(self, ex, rows):
+        self._plan.sorted(list(chain(self, rows)))
+        raise ex
+
+    # _find - Return (chunk, index) of the first row equal to row, or
+    #         (None, None)
+    def _find(self, row):
+        if not self._rows:
+            return (None, None)
+        try:
+            key = self._key_of(row)
+        except Exception:
+            return (None, None)
+        desc = self._plan.reverse
+        c = _bisect_left(self._maxes, key, desc)
+        while c < len(self._keys):
+            (keys, rows) = (self._keys[c], self._rows[c])
+            i = _bisect_left(keys, key, desc)
+            while i < len(keys):
+                if keys[i] != key:
+                    return (None, None)
+                if rows[i] is row or rows[i] == row:
+                    return (c, i)
+                i += 1
+            c += 1
+        return (None, None)
+
+    def _split(self, c):
+        load = self._load
+        (rows, keys) = (self._rows[c], self._keys[c])
+        self._rows[c + 1:c + 1] = [rows[load:]]
+        self._keys[c + 1:c + 1] = [keys[load:]]
+        del rows[load:], keys[load:]
+        self._maxes[c:c + 1] = [keys[-1], self._keys[c + 1][-1]]
+
+
+# _bisect_right / _bisect_left - bisect module equivalents that also handle
+# keys sorted in descending order
+def _bisect_right(a, x, desc) -> int:
+    if not desc:
+        return bisect_right(a, x)
+    (lo, hi) = (0, len(a))
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if x > a[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _bisect_left(a, x, desc) -> int:
+    if not desc:
+        return bisect_left(a, x)
+    (lo, hi) = (0, len(a))
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if a[mid] > x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+# SortSession - Sort one list of rows by many specs, extracting and
+# cleaning each column only once
+# Column values are cached per (key, clean) pair, so any spec built from
+# the same columns and the same clean functions reuses them. Whole columns
+# are evicted least recently used first to stay within max_bytes. Sorts use
+# the dsu engine and give the same result as multisort().
+# The rows list is not modified. Call invalidate() after changing it.
+# [rows] list of records
+# [max_bytes] memory budget for cached columns (defaults to
+#             SESSION_MAX_BYTES). None for no limit
+# Methods:
+#   sorted(spec, reverse=False, stats=None): Same as multisort(rows, ...)
+#   invalidate(key=None): Drop cached columns for key, or all columns
+# Properties:
+#   cache_bytes: approx. memory held by cached columns
+#   hits, misses: column cache lookups
+# eg:
+#   session = SortSession(rows)
+#   by_grade = session.sorted([mscol('grade', reverse=True), 'attend'])
+#   by_attend = session.sorted(['attend', 'grade'])  # no extraction
+class SortSession:
+    __slots__ = ('rows', 'max_bytes', 'hits', 'misses', '_cols', '_bytes',
+                 '_row_t')
+
+    def __init__(self, rows: list, max_bytes: int = None):
+        assert isinstance(rows, (list, tuple)), \
+            f"SortSession requires a list. Got: {rows.__class__.__name__}"
+        self.rows = rows
+        self.max_bytes = SESSION_MAX_BYTES if max_bytes is None \
+            else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.invalidate()
+
+    def sorted(self, spec: Union[int, str, list, tuple],
+               reverse: bool = False, stats: 'SortStats' = None) -> list:
+        plan = _get_plan(spec, 'dsu')
+        rows = self.rows
+        if stats is not None:
+            stats._start('dsu', len(rows))
+            t0 = perf_counter()
+        try:
+            rows_sorted = _sort_dsu(rows, plan.cols, plan.reverse,
+                                    repeat((None, None)), False, stats,
+                                    bool(reverse), self._values)
+        except Exception:
+            # Re-run a plain sort so that errors are reported as
+            # multisort() would
+            return plan.sorted(rows, reverse=reverse, stats=stats)
+        if stats is not None:
+            stats._done(t0)
+        return rows_sorted
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._cols = OrderedDict()
+            self._bytes = 0
+            self._row_t = _UNSET
+            return
+        for cache_key in [k for k in self._cols if k[0] == key]:
+            self._bytes -= self._cols.pop(cache_key)[3]
+
+    @property
+    def cache_bytes(self) -> int:
+        return self._bytes
+
+    def __repr__(self):
+        return (f"<SortSession> rows: {len(self.rows)}, columns:"
+                f" {len(self._cols)}, cache_bytes: {self._bytes}")
+
+    # _values - Return (values, clean) for spec column col, from the cache
+    #           if there. clean is None when the values are already cleaned
+    def _values(self, col) -> tuple:
+        (key, _, clean, default, required) = col
+        cache_key = (key, clean)
+        try:
+            (vals, cleaned, missing, _) = self._cols[cache_key]
+            self._cols.move_to_end(cache_key)
+            self.hits += 1
+        except KeyError:
+            (vals, cleaned, missing) = self._extract(key, clean)
+            self.misses += 1
+
+        if missing:
+            if required:
+                raise KeyError(key)
+            # Same value a missing key gets through default in multisort()
+            v_missing = default
+            if cleaned and default is not None:
+                v_missing = clean(default)
+                if v_missing is None:  # can not tell apart from None
+                    raise ValueError(key)
+            vals = [v_missing if v is _MISSING else v for v in vals]
+        return (vals, None if cleaned else clean)
+
+    def _extract(self, key, clean) -> tuple:
+        rows = self.rows
+        if self._row_t is _UNSET:
+            row_types = set(map(type, rows))
+            self._row_t = row_types.pop() if len(row_types) == 1 else None
+        (get, get_safe) = _col_getter(key, _MISSING, False, self._row_t)
+        missing = False
+        try:
+            vals = list(map(get, rows))
+        except Exception:
+            vals = list(map(get_safe, rows))
+            missing = any(v is _MISSING for v in vals)
+        cleaned = False
+        if clean:
+            vals_clean = [v if v is None or v is _MISSING else clean(v)
+                          for v in vals]
+            # None from clean sorts unlike a None value, so such columns
+            # are cached uncleaned and cleaned per sort
+            if sum(map(is_, vals_clean, repeat(None))) \
+                    == sum(map(is_, vals, repeat(None))):
+                (vals, cleaned) = (vals_clean, True)
+
+        # uncleaned values are shared with the rows
+        nbytes = getsizeof(vals) \
+            + (sum(map(getsizeof, vals)) if cleaned else 0)
+        if nbytes <= self.max_bytes:
+            self._cols[(key, clean)] = (vals, cleaned, missing, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._cols.popitem(last=False)[1][3]
+        return (vals, cleaned, missing)
+
+
+_MISSING = object()
+_UNSET = object()
+
+
+# Columns - Columnar data for multisort() and multisort_argsort()
+# Sorts columns directly, without building row objects: the sort works on
+# row indexes and each spec column reads its sequence as is.
+# [data] mapping of column name to sequence, or a tuple / list of
+#        sequences indexed by position. All sequences must have the same
+#        length. Sequences can be lists, tuples, array.array or numpy arrays
+# multisort() returns the columns reordered in the same shape as data (a
+# dict or a tuple, see apply_permutation() for the sequence types) and
+# multisort_argsort() the permutation. The 'numpy' engine lexsorts numeric
+# numpy columns without boxing their values, other engines use 'dsu'
+# eg:
+#   cols = {'grade': ['B', 'A', None], 'attend': [80, 85, 55]}
+#   cols_sorted = multisort(Columns(cols), [mscol('grade', reverse=True),
+#                                           'attend'])
+class Columns:
+    __slots__ = ('data', '_len')
+
+    def __init__(self, data):
+        seqs = list(data.values()) if isinstance(data, Mapping) else data
+        assert isinstance(seqs, (list, tuple)) and seqs, \
+            "Columns requires a mapping or a tuple / list of sequences." \
+            f" Got: {data.__class__.__name__}"
+        self._len = len(seqs[0])
+        assert all(len(seq) == self._len for seq in seqs), \
+            "Columns requires sequences of the same length"
+        self.data = data
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return f"<Columns> rows: {self._len}, data: {self.data!r}"
+
+    # _reordered - Columns reordered by perm in the same shape as data
+    def _reordered(self, perm, inplace=False):
+        data = self.data
+        if isinstance(data, Mapping):
+            seqs = apply_permutation(perm, *data.values(), inplace=inplace)
+            return data if inplace else dict(zip(data.keys(), seqs))
+        seqs = apply_permutation(perm, *data, inplace=inplace)
+        return data if inplace else tuple(seqs)
+
+
+# _argsort_columns - Sorted order of the rows of columns as row indexes
+def _argsort_columns(plan, columns, flip, stats) -> list:
+    (data, n) = (columns.data, len(columns))
+    engine = plan.engine if plan.engine in ('numpy', 'encoded') else 'dsu'
+    if stats is not None:
+        stats._start(engine, n)
+        t0 = perf_counter()
+
+    def col_values(col):
+        (key, _, clean, default, required) = col
+        try:
+            vals = data[key]
+        except (KeyError, IndexError, TypeError) as ex:
+            if required:
+                raise MultiSortError(
+                    f"Sort failed on key {key!r}. Column not found", None,
+                    ex)
+            vals = [default] * n
+        if engine != 'numpy' and np is not None \
+                and isinstance(vals, np.ndarray):
+            vals = vals.tolist()
+        return (vals, clean)
+
+    rows = range(n)
+    getters = repeat((None, None))
+    idxs = None
+    try:
+        if engine == 'numpy':
+            (idxs, fallback) = _sort_numpy(rows, plan.cols, getters,
+                                           flip=flip, gather=False,
+                                           col_values=col_values)
+        elif engine == 'encoded':
+            (idxs, fallback) = _sort_encoded(rows, plan.cols, getters,
+                                             stats=stats, flip=flip,
+                                             gather=False,
+                                             col_values=col_values)
+        if idxs is None:
+            if engine != 'dsu' and stats is not None:
+                stats.engine = 'dsu'
+                stats.fallback = fallback
+            idxs = _sort_dsu(rows, plan.cols, plan.reverse, getters,
+                             stats=stats, flip=flip, col_values=col_values,
+                             gather=False)
+    except MultiSortError:
+        raise
+    except Exception:
+        # Re-sort column by column so errors name the column
+        idxs = list(rows[::-1] if flip else rows)
+        for col in reversed(plan.cols):
+            (key, col_reverse, _, default, _) = col
+            (vals, clean) = col_values(col)
+            keys = _col_parts(vals, clean, default, False)
+            try:
+                idxs.sort(key=keys.__getitem__,
+                          reverse=bool(col_reverse) != flip)
+            except Exception as ex:
+                raise _sort_error(ex, key)
+
+    if stats is not None:
+        stats._done(t0)
+    return idxs
+
+
+# _is_arrow - True for pyarrow objects (eg. Tables, RecordBatches and
+#             Arrays), without importing pyarrow
+def _is_arrow(o) -> bool:
+    return type(o).__module__.startswith('pyarrow')
+
+
+# _argsort_arrow - Sorted order of the rows of a pyarrow Table or RecordBatch
+# The spec is translated to pyarrow.compute.sort_indices keys: reverse to
+# the key order and None placement to match multisort() (last ascending,
+# first descending), with default filled in for nulls. Columns are found by
+# name, index, or a path key into struct / list columns. The engine of
+# plan is not used.
+# Columns Arrow can not sort as multisort() would (a clean callback, a
+# default of another type, NaN, types sort_indices does not support, or
+# path levels Arrow can not resolve for every row) are converted to Python
+# lists and sorted by the 'dsu' engine (see Columns), with stats.fallback
+# and stats.convert_secs recording it.
+# [gather] True to return data reordered by the indexes (data.take())
+# Returns: a pyarrow UInt64Array of row indexes, or data reordered
+def _argsort_arrow(plan, data, flip, stats, gather=False):
+    assert hasattr(data, 'schema'), \
+        "Arrow data must be a Table or RecordBatch." \
+        f" Got: {data.__class__.__name__}"
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    n = data.num_rows
+    if stats is not None:
+        stats._start('arrow', n)
+        t0 = perf_counter()
+
+    arrays = []
+    sort_keys = []
+    fallback = None
+    for col in plan.cols:
+        (key, col_reverse, clean, default, required) = col
+        (arr, levels) = _arrow_column(data, key, pc)
+        if arr is None:
+            if required:
+                raise MultiSortError(
+                    f"Sort failed on key {key!r}. Column not found", None,
+                    None)
+            continue  # all rows get default
+        arrays.append((col, arr, levels))
+        if fallback is not None:
+            continue
+        if levels:
+            fallback = f"path {key!r} not resolved by Arrow"
+            continue
+        if clean:
+            fallback = f"clean callback on column {key!r}"
+            continue
+        try:
             if default:
-                if v is None:
-                    return default
-                return clean(v) if clean else v
+                arr = pc.fill_null(arr, default)
+            if pa.types.is_floating(arr.type) \
+                    and pc.any(pc.is_nan(arr)).as_py():
+                fallback = f"NaN in column {key!r}"
+        except (pa.ArrowException, TypeError, ValueError) as ex:
+            fallback = f"column {key!r} not supported: {ex}"
+            continue
+        name = str(len(sort_keys))
+        sort_keys.append((name, arr, 'descending' if col_reverse
+                          else 'ascending',
+                          'at_start' if col_reverse else 'at_end'))
+
+    if stats is not None:
+        t1 = perf_counter()
+        stats.extract_secs = t1 - t0
+    idxs = None
+    if fallback is None:
+        try:
+            if sort_keys:
+                idxs = pc.sort_indices(
+                    pa.table({name: arr for (name, arr, _, _) in sort_keys}),
+                    sort_keys=[(name, order, nulls)
+                               for (name, _, order, nulls) in sort_keys])
             else:
-                if v is None:
-                    return True, None
-                if clean:
-                    return False, clean(v)
-                return False, v
+                idxs = pa.array(range(n), pa.uint64())
+            if flip:
+                idxs = idxs[::-1]
+        except (pa.ArrowException, TypeError, ValueError) as ex:
+            fallback = f"not sortable by Arrow: {ex}"
 
+    if fallback is not None:
+        if stats is not None:
+            stats.engine = plan.engine if plan.engine in ('numpy', 'encoded') \
+                else 'dsu'
+            stats.fallback = fallback
+            t1 = perf_counter()
+        cols = {col[0]: _arrow_values(col, arr, levels)
+                for (col, arr, levels) in arrays}
+        if stats is not None:
+            t_convert = perf_counter()
+            stats.convert_secs = t_convert - t1
+            t1 = t_convert
+        if cols:
+            idxs = _argsort_columns(plan, Columns(cols), flip, None)
+        else:
+            idxs = range(n - 1, -1, -1) if flip else range(n)
+        idxs = pa.array(idxs, pa.uint64())
+
+    if stats is not None:
+        t2 = perf_counter()
+        stats.sort_secs = t2 - t1
+    if gather:
+        idxs = data.take(idxs)
+        if stats is not None:
+            stats.gather_secs = perf_counter() - t2
+    if stats is not None:
+        stats._done(t0)
+    return idxs
+
+
+# _arrow_column - Return (column, levels) of data for a spec key
+# Looks up column names first, then int indexes, then path keys (see
+# _key_path). Later path levels are resolved in Arrow as struct fields and
+# list indexes. levels are the path levels left for Python to look up on the
+# column's values (eg. an index past the end of some lists), else empty.
+# column is None when not found
+def _arrow_column(data, key, pc):
+    names = data.schema.names
+    if key in names:
+        return data.column(key), ()
+    if isinstance(key, int):
+        if -len(names) <= key < len(names):
+            return data.column(key % len(names)), ()
+        return None, ()
+    levels = _key_path(key)
+    if levels is None or levels[0][0] not in names:
+        return None, ()
+    arr = data.column(levels[0][0])
+    levels = levels[1:]
+    while levels:
+        (k, i) = levels[0]
+        t = arr.type
+        try:
+            if hasattr(t, 'get_field_index') and t.get_field_index(k) >= 0:
+                arr = pc.struct_field(arr, k)
+            elif type(i) is int and i >= 0 and hasattr(t, 'value_type') \
+                    and not hasattr(t, 'key_type'):  # list, not map
+                arr = pc.list_element(arr, i)
+            else:
+                break
+        except Exception:  # eg. index out of bounds for some rows
+            break
+        levels = levels[1:]
+    return arr, levels
+
+
+# _arrow_values - Python values of column arr for spec column col, looking up
+#                 the path levels Arrow could not resolve (see _arrow_column)
+def _arrow_values(col, arr, levels) -> list:
+    vals = arr.to_pylist()
+    if not levels:
+        return vals
+    (key, _, _, default, required) = col
+    get = _path_getter(key, levels, default, required, None, None)[1]
+    try:
+        return list(map(get, vals))
+    except MultiSortBaseExc as ex:
+        raise _sort_error(ex, key)
+
+
+# _sort_dsu - Decorate-sort-undecorate
+# Extracts and cleans each column exactly once into parallel key lists,
+# sorts a permutation of row indexes and gathers the rows once
+# [col_values] callable returning (values, clean) for a spec column, used
+#              instead of extracting them (see SortSession). clean is None
+#              when the values are already cleaned
+# [gather] False to return the sorted list of row indexes instead
+def _sort_dsu(rows, cols, reverse, getters, inplace=False, stats=None,
+              flip=False, col_values=None, gather=True):
+    if stats is not None:
+        t_extract = t_clean = 0.0
+
+    keys = None
+    for (col, (get, get_safe)) in zip(cols, getters):
+        (key, col_reverse, clean, default, required) = col
+        if stats is not None:
+            t0 = perf_counter()
+        if col_values is None:
+            vals = _col_values(rows, get, get_safe)
+        else:
+            (vals, clean) = col_values(col)
+        if stats is not None:
+            t1 = perf_counter()
+            t_extract += t1 - t0
+
+        parts = _col_parts(vals, clean, default,
+                           bool(col_reverse) != reverse)
+        keys = parts if keys is None else list(map(add, keys, parts))
+
+        if stats is not None:
+            if clean:
+                t_clean += perf_counter() - t1
+            else:
+                t_extract += perf_counter() - t1
+
+    if stats is not None:
+        t0 = perf_counter()
+    idxs = range(len(rows))
+    idxs = sorted(idxs[::-1] if flip else idxs, key=keys.__getitem__,
+                  reverse=reverse != flip)
+    if stats is not None:
+        t1 = perf_counter()
+    if not gather:
+        rows_sorted = idxs
+    elif inplace:
+        rows[:] = list(map(rows.__getitem__, idxs))
+        rows_sorted = rows
+    else:
+        rows_sorted = list(map(rows.__getitem__, idxs))
+
+    if stats is not None:
+        stats.extract_secs = t_extract
+        stats.clean_secs = t_clean
+        stats.sort_secs = t1 - t0
+        stats.gather_secs = perf_counter() - t1
+        stats.key_bytes = getsizeof(keys) + sum(map(getsizeof, keys)) \
+            + getsizeof(idxs) + sum(map(getsizeof, idxs))
+
+    return rows_sorted
+
+
+# _sort_runs - Sort rows expected to be sorted or nearly sorted
+# Computes the composite keys once and checks the order in one linear scan.
+# Sorted rows are returned as a copy without sorting. Otherwise the same
+# keys are sorted, where Timsort merges the existing runs in near linear
+# time
+def _sort_runs(rows, key, desc, inplace=False, flip=False, stats=None):
+    src = rows[::-1] if flip else rows
+    keys = list(map(key, src))
+    out_of_order = gt if desc else lt
+    if stats is None:
+        presorted = not any(map(out_of_order, islice(keys, 1, None), keys))
+    else:
+        flags = list(map(out_of_order, islice(keys, 1, None), keys))
+        stats.inversions = flags.count(True)
+        stats.sorted_prefix = (flags.index(True) + 1 if stats.inversions
+                               else len(keys))
+        presorted = stats.presorted = not stats.inversions
+
+    if presorted:
+        if inplace:
+            if flip:
+                rows.reverse()
+            return rows
+        return list(src) if src is rows or isinstance(src, tuple) else src
+
+    idxs = sorted(range(len(keys)), key=keys.__getitem__, reverse=desc)
+    rows_sorted = list(map(src.__getitem__, idxs))
+    if inplace:
+        rows[:] = rows_sorted
+        return rows
+    return rows_sorted
+
+
+# _col_values - List of one column's values for all rows
+def _col_values(rows, get, get_safe) -> list:
+    try:
+        return list(map(get, rows))
+    except Exception:
+        return list(map(get_safe, rows))
+
+
+# _col_parts - Turn a list of column values into key parts
+# Same keys as _col_key() returns for each value
+def _col_parts(vals, clean, default, invert):
+    if default:
+        if invert:
+            if clean:
+                return [(_invert(default) if v is None else
+                         _invert(clean(v)),) for v in vals]
+            return [(_invert(default if v is None else v),) for v in vals]
+        if clean:
+            return [(default if v is None else clean(v),) for v in vals]
+        return [(default if v is None else v,) for v in vals]
+
+    if invert:
+        if clean:
+            return [_NONE_FIRST if v is None else (True, _invert(clean(v)))
+                    for v in vals]
+        return [_NONE_FIRST if v is None else (True, _invert(v))
+                for v in vals]
+
+    if clean:
+        return [_NONE_LAST if v is None else (False, clean(v)) for v in vals]
+    return [_NONE_LAST if v is None else (False, v) for v in vals]
+
+
+_NONE_LAST = (True, None)
+_NONE_FIRST = (False, None)
+
+
+# _sort_encoded - Sort on one order preserving bytes key per row
+# Each column is encoded per value (see _encode_col) and the column
+# encodings are concatenated, so Timsort compares flat bytes with memcmp.
+# Returns (rows_sorted, None), or (None, reason) when a column can not be
+# encoded with identical results and the caller must fall back.
+# [gather] False to return the sorted list of row indexes instead of rows
+# [col_values] same as _sort_dsu() col_values
+def _sort_encoded(rows, cols, getters, inplace=False, stats=None,
+                  flip=False, gather=True, col_values=None) -> tuple:
+    if stats is not None:
+        t_extract = t_encode = 0.0
+
+    keys = None
+    for (col, (get, get_safe)) in zip(cols, getters):
+        (key, col_reverse, clean, default, required) = col
+        if stats is not None:
+            t0 = perf_counter()
+        if col_values is None:
+            vals = _col_values(rows, get, get_safe)
+        else:
+            (vals, clean) = col_values(col)
+        if stats is not None:
+            t1 = perf_counter()
+            t_extract += t1 - t0
+
+        parts = _encode_col(vals, clean, default, col_reverse)
+        if isinstance(parts, str):
+            return None, f"column {key!r} {parts}"
+        keys = parts if keys is None else list(map(add, keys, parts))
+
+        if stats is not None:
+            t_encode += perf_counter() - t1
+
+    if stats is not None:
+        t0 = perf_counter()
+    idxs = range(len(rows))
+    idxs = sorted(idxs[::-1] if flip else idxs, key=keys.__getitem__,
+                  reverse=flip)
+    if stats is not None:
+        t1 = perf_counter()
+    if not gather:
+        rows_sorted = idxs
+    elif inplace:
+        rows[:] = list(map(rows.__getitem__, idxs))
+        rows_sorted = rows
+    else:
+        rows_sorted = list(map(rows.__getitem__, idxs))
+
+    if stats is not None:
+        stats.extract_secs = t_extract
+        stats.encode_secs = t_encode
+        stats.sort_secs = t1 - t0
+        stats.gather_secs = perf_counter() - t1
+        stats.key_bytes = getsizeof(keys) + sum(map(getsizeof, keys)) \
+            + getsizeof(idxs) + sum(map(getsizeof, idxs))
+
+    return rows_sorted, None
+
+
+# _encode_col - Encode one column of values as order preserving bytes
+# Values are tagged so None sorts last, then encoded as:
+#   int: 8 bytes big endian offset from the int64 minimum
+#   float (or ints mixed with floats): 8 bytes of the IEEE 754 bits with
+#     the sign bit flipped for positives and all bits flipped for negatives
+#   str: utf-8, which has code point order, closed with a NUL byte
+# Reversed columns have every byte inverted.
+# Returns a list of bytes or a str describing why the column can not be
+# encoded
+def _encode_col(vals, clean, default, col_reverse):
+    if clean:
+        nones = 0 if default else sum(map(is_, vals, repeat(None)))
+    if default:
+        vals = [default if v is None else clean(v) if clean else v
+                for v in vals]
+    elif clean:
+        vals = [None if v is None else clean(v) for v in vals]
+    # None from clean is an error in the other engines
+    if clean and sum(map(is_, vals, repeat(None))) != nones:
+        return 'has values cleaned to None'
+
+    types = set(map(type, vals))
+    types.discard(type(None))
+    if not types:
+        parts = [_ENC_NONE] * len(vals)
+
+    elif types <= _ENC_INT_TYPES:
+        try:
+            parts = [_ENC_NONE if v is None else
+                     _ENC_VALUE + (v + _ENC_INT_BIAS).to_bytes(8, 'big')
+                     for v in vals]
+        except OverflowError:
+            return 'has integers outside of int64'
+
+    elif types <= _ENC_NUM_TYPES:
+        parts = []
+        for v in vals:
+            if v is None:
+                parts.append(_ENC_NONE)
+                continue
+            f = float(v) + 0.0  # +0.0 folds -0.0 into 0.0
+            if f != v:  # NaN, or an int not exact as a float
+                return 'has NaN or ints not exact as float64'
+            bits = _unpack_u64(_pack_f64(f))[0]
+            bits = bits ^ _ENC_U64_MASK if bits >> 63 else bits | _ENC_SIGN
+            parts.append(_ENC_VALUE + bits.to_bytes(8, 'big'))
+
+    elif types == _ENC_STR_TYPES:
+        if '\x00' in ''.join(v for v in vals if v is not None):
+            return 'has strings with NUL characters'
+        try:
+            parts = [_ENC_NONE if v is None else
+                     _ENC_VALUE + v.encode('utf-8') + b'\x00'
+                     for v in vals]
+        except UnicodeEncodeError:
+            return 'has strings with lone surrogates'
+
+    else:
+        return 'has values of type ' + ', '.join(
+            sorted(t.__name__ for t in types))
+
+    if col_reverse:
+        return [p.translate(_INV_BYTES) for p in parts]
+    return parts
+
+
+_ENC_VALUE = b'\x01'
+_ENC_NONE = b'\x02'
+_ENC_INT_TYPES = frozenset((int, bool))
+_ENC_NUM_TYPES = frozenset((int, bool, float))
+_ENC_STR_TYPES = frozenset((str,))
+_ENC_INT_BIAS = 1 << 63
+_ENC_SIGN = 1 << 63
+_ENC_U64_MASK = (1 << 64) - 1
+_pack_f64 = Struct('>d').pack
+_unpack_u64 = Struct('>Q').unpack
+
+
+# _sort_numpy - Sort with numpy.lexsort on typed column arrays
+# Each column becomes an int64, float64 or str array, preceded by a None mask
+# array when it holds None. Reversed columns are negated (strings by rank).
+# Returns (rows_sorted, None), or (None, reason) when a column can not be
+# vectorized with identical results and the caller must fall back.
+# [gather] False to return the sorted numpy array of row indexes instead
+# [col_values] same as _sort_dsu() col_values
+def _sort_numpy(rows, cols, getters, inplace=False, flip=False,
+                gather=True, col_values=None) -> tuple:
+    if np is None:
+        return None, 'numpy not installed'
+
+    keys = []
+    for (col, (get, get_safe)) in zip(cols, getters):
+        (key, col_reverse, clean, default, required) = col
+        if col_values is None:
+            vals = _col_values(rows, get, get_safe)
+        else:
+            (vals, clean) = col_values(col)
+        if clean:
+            return None, f"column {key!r} has a clean callback"
+        col = _np_col(vals, default, col_reverse)
+        if isinstance(col, str):
+            return None, f"column {key!r} {col}"
+        keys.extend(col)
+
+    if not keys:  # every column entirely None
+        order = np.arange(len(rows))
+    elif len(keys) == 1:
+        order = np.argsort(keys[0], kind='stable')
+    else:
+        # lexsort takes the primary key last
+        order = np.lexsort(keys[::-1])
+    if not gather:
+        return (order[::-1] if flip else order), None
+    idxs = (order[::-1] if flip else order).tolist()
+
+    if inplace:
+        rows[:] = list(map(rows.__getitem__, idxs))
+        return rows, None
+    return list(map(rows.__getitem__, idxs)), None
+
+
+# _np_col - Return the key arrays for one column of values, most significant
+#           first, or a str describing why the column can not be vectorized
+# Numeric numpy arrays are used as they are, without boxing their values
+def _np_col(vals, default, col_reverse):
+    if isinstance(vals, np.ndarray) and vals.dtype.kind in 'biuf':
+        arr = vals
+        if arr.dtype.kind == 'f':
+            if np.isnan(arr).any():
+                return 'has NaN'
+            return [-arr if col_reverse else arr]
+        if col_reverse:
+            if arr.dtype.kind == 'u' and arr.dtype.itemsize == 8 \
+                    and len(arr) and arr.max() > np.iinfo(np.int64).max:
+                return 'has integers outside of int64'
+            arr = arr.astype(np.int64)
+            if len(arr) and arr.min() == np.iinfo(np.int64).min:
+                return 'has integers outside of int64'
+            arr = -arr
+        return [arr]
+
+    if default:
+        vals = [default if v is None else v for v in vals]
+
+    types = set(map(type, vals))
+    has_none = type(None) in types
+    types.discard(type(None))
+    if not types:
+        return []
+
+    obj = np.empty(len(vals), dtype=object)
+    obj[:] = vals
+    if has_none:
+        mask = obj == None  # noqa: E711 - elementwise
+        obj[mask] = '' if str in types else 0
+
+    if all(issubclass(t, str) for t in types):
+        arr = obj.astype(str)
+        if '\x00' in ''.join(obj):  # numpy drops trailing NUL chars
+            return 'has strings with NUL characters'
+        if col_reverse:
+            arr = -np.unique(arr, return_inverse=True)[1]
+
+    elif all(issubclass(t, (int, np.integer)) for t in types):
+        try:
+            arr = obj.astype(np.int64)
+        except OverflowError:
+            return 'has integers outside of int64'
+        if col_reverse:
+            if arr.min() == np.iinfo(np.int64).min:
+                return 'has integers outside of int64'
+            arr = -arr
+
+    elif all(issubclass(t, (int, float, np.integer, np.floating))
+             for t in types):
+        arr = obj.astype(np.float64)
+        # NaN does not compare the same and large ints lose precision
+        if np.isnan(arr).any():
+            return 'has NaN'
+        if any(issubclass(t, (int, np.integer)) for t in types) \
+                and not (arr.astype(object) == obj).all():
+            return 'has ints not exact as float64'
+        if col_reverse:
+            arr = -arr
+
+    else:
+        return 'has values of type ' + ', '.join(
+            sorted(t.__name__ for t in types))
+
+    if not has_none:
+        return [arr]
+    # None sorts last ascending and first when reversed
+    return [~mask if col_reverse else mask, arr]
+
+
+# _sort_parallel - Sort chunks of rows in worker processes and merge
+# Workers return each chunk's sorted order and keys so rows are never copied
+# back. The sorted runs are merged by one more sort in the parent, which
+# Timsort does as a merge of the existing runs.
+# [threads] use a thread pool instead. Threads share the rows and spec, so
+#           nothing is pickled, but they only run in parallel on free
+#           threaded builds
+# Returns None when the sort should run in process instead.
+def _sort_parallel(plan, rows, workers, stats, threads=False):
+    if not threads:
+        try:
+            pickle.dumps(plan.cols)
+        except Exception as ex:
+            raise MultiSortError(
+                "parallel=True requires a picklable spec. Use module level"
+                " functions for clean callbacks or parallel='thread' on"
+                f" free threaded builds. Got: {ex}", None, ex)
+
+    workers = workers or os.cpu_count() or 1
+    fallback = None
+    if threads and _gil_enabled():
+        fallback = "GIL enabled, threads would not sort in parallel"
+    elif len(rows) < PARALLEL_MIN_ROWS:
+        fallback = f"fewer than PARALLEL_MIN_ROWS ({PARALLEL_MIN_ROWS}) rows"
+    elif workers < 2:
+        fallback = "fewer than 2 workers"
+    if fallback:
+        if stats is not None:
+            stats._handoff = fallback
+        return None
+
+    if stats is not None:
+        stats._start('parallel-threads' if threads else 'parallel',
+                     len(rows))
+        t0 = perf_counter()
+
+    size = -(-len(rows) // workers)
+    starts = range(0, len(rows), size)
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    try:
+        with pool(max_workers=workers) as executor:
+            runs = list(executor.map(
+                _sort_chunk, repeat(plan.cols),
+                (rows[i:i + size] for i in starts)))
+    except Exception as ex:
+        # Sort in process so errors are reported as usual
+        if stats is not None:
+            stats._handoff = f"worker failed: {ex!r}"
+        return None
+
+    idxs = []
+    keys = []
+    for (start, (run_idxs, run_keys)) in zip(starts, runs):
+        idxs.extend([start + i for i in run_idxs])
+        keys.extend(run_keys)
+    order = sorted(range(len(keys)), key=keys.__getitem__,
+                   reverse=plan.reverse)
+    rows_sorted = list(map(rows.__getitem__, map(idxs.__getitem__, order)))
+
+    if stats is not None:
+        stats._done(t0)
+    return rows_sorted
+
+
+# _gil_enabled - False on free threaded builds running without the GIL
+def _gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+# _sort_chunk - Worker for _sort_parallel. Returns (sorted_idxs, keys)
+def _sort_chunk(cols, rows) -> tuple:
+    plan = _get_plan(cols)
+    keys = list(map(plan.keys(rows)[0], rows))
+    idxs = sorted(range(len(rows)), key=keys.__getitem__,
+                  reverse=plan.reverse)
+    return idxs, list(map(keys.__getitem__, idxs))
+
+
+def _sort_multipass(rows, col_keys, inplace=False, flip=False):
+    rows_sorted = None
+    if inplace:
+        rows_sorted = rows
+        if flip:
+            rows.reverse()
+    for (key, col_reverse, _sort_column) in reversed(col_keys):
+        col_reverse = bool(col_reverse) != flip
         try:
             if rows_sorted is None:
-                rows_sorted = sorted(rows,
+                rows_sorted = sorted(reversed(rows) if flip else rows,
                                      key=_sort_column,
                                      reverse=col_reverse)
             else:
                 rows_sorted.sort(key=_sort_column, reverse=col_reverse)
 
         except Exception as ex:
-            sb = []
-            msg = None
-            row = None
-            key_is_int = isinstance(key, int)
+            raise _sort_error(ex, key)
 
-            if isinstance(ex, MultiSortBaseExc):
-                row = ex.row
-                if isinstance(ex, MSIndexError):
-                    sb.append(f"Invalid index for {row.__class__.__name__}")
-                    sb.append(f" row of length {len(row)}. Row: {row}")
-                else:  # MSKeyError
-                    sb.append("Invalid key/property for row of type")
-                    sb.append(f" {row.__class__.__name__}. Row: {row}")
-                msg = ' '.join(sb)
+    return rows_sorted
+
+
+# _sort_profiled - _sort_multipass with counting key functions and a timed
+#                  pass per column, filling the profile fields of stats
+#                  (see SortStats). The totals are recorded and the
+#                  callback notified even when the sort raises
+def _sort_profiled(plan, rows, inplace, flip, stats, gather, t0):
+    stats.engine = 'multipass'
+
+    row_types = set(map(type, rows))
+    row_t = row_types.pop() if len(row_types) == 1 else None
+    col_keys = []
+    for (key, col_reverse, clean, default, required) in plan.cols:
+        counts = dict(key=key, reverse=bool(col_reverse), secs=0.0,
+                      key_calls=0, clean_calls=0, clean_secs=0.0,
+                      lookup_fallbacks=0, attr_lookups=0, defaults=0,
+                      errors=0)
+        stats.columns.append(counts)
+        _sort_column = _col_key(key, clean, default, required, row_t=row_t,
+                                counts=counts,
+                                nones_first=plan._nones_first(col_reverse))
+        if not gather:
+            _sort_column = _on_row(_sort_column, rows.__getitem__)
+        col_keys.append((key, col_reverse, _sort_column, counts))
+
+    rows_sorted = None
+    src = rows if gather else range(len(rows))
+    if inplace:
+        rows_sorted = rows
+        if flip:
+            rows.reverse()
+    try:
+        for (key, col_reverse, _sort_column, counts) in reversed(col_keys):
+            col_reverse = bool(col_reverse) != flip
+            stats.passes += 1
+            t1 = perf_counter()
+            try:
+                if rows_sorted is None:
+                    rows_sorted = sorted(reversed(src) if flip else src,
+                                         key=_sort_column,
+                                         reverse=col_reverse)
+                else:
+                    rows_sorted.sort(key=_sort_column, reverse=col_reverse)
+
+            except Exception as ex:
+                counts['errors'] += 1
+                raise _sort_error(ex, key)
+
+            finally:
+                counts['secs'] = perf_counter() - t1
+
+    finally:
+        for name in ('key_calls', 'clean_calls', 'clean_secs',
+                     'lookup_fallbacks', 'attr_lookups', 'defaults',
+                     'errors'):
+            setattr(stats, name, sum(c[name] for c in stats.columns))
+        stats._done(t0)
+
+    return rows_sorted
+
+
+# _argsort_multipass - _sort_multipass on row indexes
+def _argsort_multipass(rows, col_keys, flip=False) -> list:
+    get_row = rows.__getitem__
+    col_keys = tuple((key, col_reverse, _on_row(_sort_column, get_row))
+                     for (key, col_reverse, _sort_column) in col_keys)
+    return _sort_multipass(range(len(rows)), col_keys, False, flip)
+
+
+def _on_row(_sort_column, get_row):
+    return lambda i: _sort_column(get_row(i))
+
+
+# _get_plan - Return a SortPlan for spec, cached when spec is hashable
+# Specs equal by value but not by type (eg. [1], [1.0] and [True]) are
+# cached apart, so each is validated as given
+def _get_plan(spec, engine='compiled', none_last=False) -> SortPlan:
+    if isinstance(spec, (int, str)):
+        spec_types = type(spec)
+    else:
+        spec = tuple(tuple(c) if isinstance(c, list) else c for c in spec)
+        spec_types = tuple(tuple(map(type, c)) if type(c) is tuple
+                           else type(c) for c in spec)
+    try:
+        return _get_plan_cached(spec, engine, none_last, spec_types)
+    except TypeError:  # unhashable spec (eg. list default)
+        return SortPlan(spec, engine, none_last)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _get_plan_cached(spec, engine, none_last, spec_types) -> SortPlan:
+    return SortPlan(spec, engine, none_last)
+
+
+# _norm_spec - Expand spec into a list of full 5 value <spec> tuples
+def _norm_spec(spec) -> list:
+    if isinstance(spec, (int, str)):
+        return [mscol(spec)]
+    cols = []
+    for spec_c in spec:
+        spec_c_t = type(spec_c)
+        if spec_c_t in (int, str):
+            cols.append((spec_c, False, None, None, True))
+        else:
+            assert spec_c_t in (list, tuple), \
+                    f"Invalid spec. Got: {spec_c_t.__name__}. See docs"
+            if len(spec_c) < 5:
+                spec_c = mscol(*spec_c)
+            cols.append(tuple(spec_c))
+    return cols
+
+
+# _col_key - Build the key function for one spec column
+# Keys are always tuples so the compiled engine can concatenate them into one
+# flat composite key, which compares much faster than nested tuples.
+# [invert] return a key that sorts in the opposite direction of the value.
+#          Used by the compiled engine for columns whose direction differs
+#          from the direction of the sort pass.
+# [row_t] row type when all rows share one type. Used to pick a specialized
+#         accessor (see _accessor). Lookups failing through it fall back to
+#         the generic path for defaults and error reporting.
+# [counts] profile counters dict of the column (see _sort_profiled). The key
+#          function, lookups and clean are wrapped to count calls
+# [nones_first] None sorts before values in the key's ascending order
+#               (defaults to invert, so None sorts last in the column's
+#               direction)
+def _col_key(key, clean, default, required, invert=False, row_t=None,
+             counts=None, nones_first=None):
+    (get, _get) = _col_getter(key, default, required, row_t, counts)
+    if counts is not None and clean:
+        clean = _counted_clean(clean, counts)
+
+    if default:
+        if invert:
+            def _sort_column(row):
+                try:
+                    v = get(row)
+                except Exception:
+                    v = _get(row)
+                if v is None:
+                    return _invert(default),
+                return _invert(clean(v) if clean else v),
+        else:
+            def _sort_column(row):
+                try:
+                    v = get(row)
+                except Exception:
+                    v = _get(row)
+                if v is None:
+                    return default,
+                return (clean(v) if clean else v),
+
+    elif nones_first is not None and nones_first != invert:
+        none_key = _NONE_FIRST if nones_first else _NONE_LAST
+
+        def _sort_column(row):
+            try:
+                v = get(row)
+            except Exception:
+                v = _get(row)
+            if v is None:
+                return none_key
+            if clean:
+                v = clean(v)
+            return nones_first, (_invert(v) if invert else v)
+
+    elif invert:
+        # None sorts last ascending so it must come first when inverted
+        def _sort_column(row):
+            try:
+                v = get(row)
+            except Exception:
+                v = _get(row)
+            if v is None:
+                return _NONE_FIRST
+            if clean:
+                return True, _invert(clean(v))
+            return True, _invert(v)
+
+    else:
+        def _sort_column(row):
+            try:
+                v = get(row)
+            except Exception:
+                v = _get(row)
+            if v is None:
+                return _NONE_LAST
+            if clean:
+                return False, clean(v)
+            return False, v
+
+    if counts is not None:
+        return _counted_key(_sort_column, counts)
+    return _sort_column
+
+
+def _counted_key(_sort_column, counts):
+    def _key(row):
+        counts['key_calls'] += 1
+        return _sort_column(row)
+    return _key
+
+
+def _counted_clean(clean, counts):
+    def _clean(v):
+        counts['clean_calls'] += 1
+        t0 = perf_counter()
+        try:
+            return clean(v)
+        finally:
+            counts['clean_secs'] += perf_counter() - t0
+    return _clean
+
+
+def _counted_get(get, counts):
+    def _get(row):
+        try:
+            return get(row)
+        except Exception:
+            counts['lookup_fallbacks'] += 1
+            raise
+    return _get
+
+
+# _col_getter - Return (get, get_safe) value getters for one spec column
+#   get: fastest getter for row type row_t. May raise for any row
+#   get_safe: generic lookup applying required / default.
+#             Throws MSIndexError, MSKeyError
+# [counts] profile counters dict (see _col_key). Only touched on the
+#          exception paths
+def _col_getter(key, default, required, row_t=None, counts=None) -> tuple:
+    levels = _key_path(key)
+    if levels is not None:
+        return _path_getter(key, levels, default, required, row_t, counts)
+
+    def _get(row):  # Throws MSIndexError, MSKeyError
+        ex1 = None
+        try:
+            try:
+                return row[key]
+            except Exception as ex:
+                ex1 = ex
+                if counts is not None:
+                    counts['attr_lookups'] += 1
+                return getattr(row, key)
+        except Exception as ex2:
+            if isinstance(row, (list, tuple)):  # failfast for tuple / list
+                raise MSIndexError(ex1.args[0], row, ex1)
+
+            elif required:
+                raise MSKeyError(ex2.args[0], row, ex2)
+
+            else:
+                if counts is not None:
+                    counts['defaults'] += 1
+                return default
+
+    get = _accessor(key, row_t)
+    if get is None:
+        return _get, _get
+    if counts is not None:
+        get = _counted_get(get, counts)
+    return get, _get
+
+
+# _key_path - Levels of a path key as (key, index) pairs, or None for a plain
+#             key. index is the level as an int for sequences when it is
+#             one, else the key itself
+#   'customer.address.zip' -> (('customer', 'customer'), ...)
+#   'items.0.price': '0' indexes lists / tuples, and is a key of dicts
+#   ('customer', 'address', 'zip'): levels as given (any tuple key)
+def _key_path(key):
+    if isinstance(key, str):
+        if '.' not in key:
+            return None
+        return tuple((k, int(k) if k.isdigit() else k)
+                     for k in key.split('.'))
+    if isinstance(key, tuple):
+        return tuple((k, k) for k in key)
+    return None
+
+
+# _path_getter - _col_getter() for path keys
+# Each level is looked up as the plain keys are (row[key] then
+# getattr(row, key)) but without raising for a missing level:
+#   None at any level: the value is None
+#   missing level: default when not required, else MSKeyError
+# On dict rows a key that is itself in the row (eg. 'price.usd' or a tuple
+# key) is used as is, so such keys keep working.
+# get is a chain of C level getters when the levels are known from row_t
+# (dicts of dicts / lists, or objects of objects) and required is True.
+# Otherwise it is the generic lookup, which never raises for missing levels
+def _path_getter(key, levels, default, required, row_t, counts) -> tuple:
+    def _get(row):  # Throws MSKeyError
+        if (type(row) is dict or isinstance(row, Mapping)) and key in row:
+            return row[key]
+        v = row
+        for (k, i) in levels:
+            if v is None:
+                return None
+            t = type(v)
+            if t is dict:
+                v = v.get(k, _MISSING)
+            elif t is list or t is tuple or isinstance(v, (list, tuple)):
+                if type(i) is int:
+                    v = v[i] if -len(v) <= i < len(v) else _MISSING
+                else:  # namedtuple field
+                    v = getattr(v, k, _MISSING)
+            elif isinstance(v, Mapping):
+                v = v.get(k, _MISSING)
+            elif hasattr(t, '__getitem__'):
+                try:
+                    v = v[k]
+                except Exception:
+                    if counts is not None:
+                        counts['attr_lookups'] += 1
+                    v = getattr(v, k, _MISSING)
             else:
-                msg = ex.args[0]
+                v = getattr(v, k, _MISSING)
+
+            if v is _MISSING:
+                if required:
+                    raise MSKeyError(f"{k!r} of {key!r}", row, None)
+                if counts is not None:
+                    counts['defaults'] += 1
+                return default
+        return v
+
+    get = _path_accessor(key, levels, row_t) if required else None
+    if get is None:
+        return _get, _get
+    if counts is not None:
+        get = _counted_get(get, counts)
+    return get, _get
+
+
+# _path_accessor - Chain of C level getters for path levels given row type
+#                  row_t. Returns None when the generic lookup must be used
+#   dict rows: key itself is checked first, as _path_getter does
+def _path_accessor(key, levels, row_t):
+    if row_t is None:
+        return None
+    if issubclass(row_t, dict):
+        chain = _getter_chain([itemgetter(i) for (_, i) in levels])
+        return lambda row: row[key] if key in row else chain(row)
+    if not hasattr(row_t, '__getitem__') \
+            and all(type(k) is str and k.isidentifier() for (k, _) in levels):
+        return attrgetter('.'.join(k for (k, _) in levels))
+    return None
+
+
+# _getter_chain - Single getter applying getters gs in turn
+def _getter_chain(gs):
+    if len(gs) == 1:
+        return gs[0]
+
+    if len(gs) == 2:
+        (g0, g1) = gs
+        return lambda row: g1(g0(row))
+
+    if len(gs) == 3:
+        (g0, g1, g2) = gs
+        return lambda row: g2(g1(g0(row)))
+
+    def _chain(row):
+        for g in gs:
+            row = g(row)
+        return row
+    return _chain
+
+
+# _accessor - Pick a C level getter for key given the shape of row type row_t
+# Mirrors the generic lookup (row[key] then getattr(row, key)):
+#   dict, list, tuple: itemgetter
+#   namedtuple: itemgetter for int keys, attrgetter for str keys
+#   objects without __getitem__ (plain, __slots__, dataclass): attrgetter
+# Returns None when the generic lookup must be used. Path keys are handled
+# by _path_accessor
+def _accessor(key, row_t):
+    if row_t is None:
+        return None
+    if issubclass(row_t, dict):
+        return itemgetter(key)
+    if issubclass(row_t, (list, tuple)):
+        if isinstance(key, str) and hasattr(row_t, '_fields'):
+            return attrgetter(key)
+        return itemgetter(key)
+    if not hasattr(row_t, '__getitem__') and isinstance(key, str):
+        return attrgetter(key)
+    return None
+
+
+# _compile_key - Build a single composite key function for all columns
+# The key sorts in the direction of the first column. Any column sorting the
+# other way is inverted (negated for numbers, else wrapped).
+# [none_last] None sorts last in every column (see SortPlan)
+def _compile_key(cols, row_t=None, none_last=False):
+    reverse = bool(cols[0][1])
+    fs = [_col_key(key, clean, default, required,
+                   invert=bool(col_reverse) != reverse, row_t=row_t,
+                   nones_first=reverse if none_last else None)
+          for (key, col_reverse, clean, default, required) in cols]
+
+    if len(fs) == 1:
+        return fs[0]
 
-            msg = "Sort failed on key {0}{1}{2}. {3}".format(
-                            "int" if key_is_int else "str '",
-                            key,
-                            '' if key_is_int else "' ",
-                            msg)
-            raise MultiSortError(msg, row, ex)
+    if len(fs) == 2:
+        (f0, f1) = fs
+        return lambda row: f0(row) + f1(row)
 
-    return reversed(rows_sorted) if reverse else rows_sorted
+    if len(fs) == 3:
+        (f0, f1, f2) = fs
+        return lambda row: f0(row) + f1(row) + f2(row)
+
+    return lambda row: sum([f(row) for f in fs], ())
+
+
+# _invert - Order inverting key for one value
+# Numbers are negated and str values are encoded into bytes that compare in
+# the reverse order, so both compare in C. Anything else is wrapped.
+def _invert(v):
+    t = type(v)
+    if t in _NEGATABLE:
+        return -v
+    if t is Decimal:  # unary minus rounds to the context precision
+        return v.copy_negate()
+    if t is str and '\x00' not in v:
+        try:
+            return v.encode('utf-32-be').translate(_INV_BYTES) + _INV_STR_END
+        except UnicodeEncodeError:  # lone surrogates
+            pass
+    return _Inverted(v)
+
+
+_NEGATABLE = frozenset((int, float, bool, Fraction))
+# utf-32-be compares in code point order, so inverting every byte inverts
+# the order. A string's inverted encoding is closed with a unit greater than
+# any inverted code point (only NUL inverts to all 0xff), so a string sorts
+# after the strings it is a prefix of.
+_INV_BYTES = bytes(range(255, -1, -1))
+_INV_STR_END = b'\xff\xff\xff\xff'
+
+
+# _Inverted - Order inverting wrapper for values that cannot be encoded
+class _Inverted:
+    __slots__ = ('v',)
+
+    def __init__(self, v):
+        self.v = v
+
+    def __eq__(self, other):
+        return self.v == _uninvert(other)
+
+    def __lt__(self, other):
+        return _uninvert(other) < self.v
+
+    def __gt__(self, other):  # reflected compare against an encoded value
+        return self.v < _uninvert(other)
+
+
+def _uninvert(o):
+    t = type(o)
+    if t is _Inverted:
+        return o.v
+    if t is bytes:
+        return o[:-4].translate(_INV_BYTES).decode('utf-32-be')
+    if t is Decimal:
+        return o.copy_negate()
+    return -o
+
+
+def _sort_error(ex, key):
+    sb = []
+    msg = None
+    row = None
+    key_is_int = isinstance(key, int)
+
+    if isinstance(ex, MultiSortBaseExc):
+        row = ex.row
+        if isinstance(ex, MSIndexError):
+            sb.append(f"Invalid index for {row.__class__.__name__}")
+            sb.append(f" row of length {len(row)}. Row: {row}")
+        else:  # MSKeyError
+            sb.append("Invalid key/property for row of type")
+            sb.append(f" {row.__class__.__name__}. Row: {row}")
+        msg = ' '.join(sb)
+    else:
+        msg = ex.args[0]
+
+    msg = "Sort failed on key {0}{1}{2}. {3}".format(
+                    "int" if key_is_int else "str '",
+                    key,
+                    '' if key_is_int else "' ",
+                    msg)
+    return MultiSortError(msg, row, ex)
 
 
 def mscol(key, reverse=False, clean=None, default=None, required=True):
@@ -170,19 +2596,27 @@ class MultiSortError(MultiSortBaseExc):
 #              ((None if o[COL_GRADE] is None else o[COL_GRADE].lower()),
 #              reversor(o[COL_ATTEND])), reverse=True)
 #     where: COL_GRADE and COL_ATTEND are column indexes for values
+#  reversor is a tuple that compares in C for numbers and str (see
+#  _invert). None sorts after all values, as it always has.
+class reversor(tuple):
+    __slots__ = ()
 
+    def __new__(cls, obj):
+        if obj is None:
+            return tuple.__new__(cls, (True,))
+        # -True is -1, so a bool is wrapped to keep obj a bool
+        return tuple.__new__(cls, (False, _Inverted(obj) if type(obj)
+                                   is bool else _invert(obj)))
 
-class reversor:
-    def __init__(self, obj):
-        self.obj = obj
+    @property
+    def obj(self):
+        return _uninvert(self[1]) if len(self) == 2 else None
 
-    def __eq__(self, other):
-        return other.obj == self.obj
+    def __getnewargs__(self):  # pickle / copy rebuild from obj
+        return (self.obj,)
 
-    def __lt__(self, other):
-        return False if self.obj is None else \
-               True if other.obj is None else \
-               other.obj < self.obj
+    def __repr__(self):
+        return f"reversor({self.obj!r})"
 
 
 def getClassName(o):
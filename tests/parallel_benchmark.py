@@ -0,0 +1,51 @@
+import os
+import sys
+import sysconfig
+from random import randint, random
+from time import perf_counter
+from multisort import multisort, mscol, SortStats
+import test_util as util
+
+ROWS = 1_000_000
+ITERATIONS = 3
+WORKERS = os.cpu_count()
+
+
+def main():
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    free_threaded = bool(sysconfig.get_config_var('Py_GIL_DISABLED'))
+    print(f"Python {sys.version.split()[0]}, free threaded build:"
+          f" {free_threaded}, GIL enabled: {gil}, workers: {WORKERS}")
+
+    rows = [{'idx': i,
+             'grade': 'ABCDEF'[randint(0, 5)],
+             'attend': randint(0, 100),
+             'score': random()} for i in range(ROWS)]
+    # A closure, which parallel=True (processes) can not pickle
+    weights = {'A': 4, 'B': 3, 'C': 2, 'D': 1}
+    spec = [mscol('grade', reverse=True,
+                  clean=lambda v: weights.get(v, 0)),
+            'attend', mscol('score', reverse=True)]
+
+    table = util.quickTT(['mode', 'engine used', 's/iter', 'speedup'])
+    base = None
+    for (name, parallel) in (('single thread', False),
+                             ("parallel='thread'", 'thread')):
+        stats = SortStats()
+        t0 = perf_counter()
+        for _ in range(ITERATIONS):
+            multisort(rows, spec, parallel=parallel, workers=WORKERS,
+                      stats=stats)
+        secs = (perf_counter() - t0) / ITERATIONS
+        base = base or secs
+        table.add_row([name, stats.engine + (' (fallback)' if
+                                             stats.fallback else ''),
+                       f"{secs:.4f}", f"{base / secs:.2f}x"])
+        if stats.fallback:
+            print(f"{name}: {stats.fallback}")
+
+    print(f"{ROWS} rows, {ITERATIONS} iterations:\n{table.draw()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,180 +1,450 @@
-import asyncio
-import pandas
-from random import randint
+#########################################
+# .: performance_tests.py :.
+# Benchmark suite for multisort
+# Sweeps row counts, row shapes, column counts, None density and
+# presortedness, times each sort method on identical data and reports time
+# per row, peak memory (tracemalloc) and speed relative to the hand written
+# `superfast` baseline and pandas (when installed).
+# Usage:
+#   python performance_tests.py                       # quick sweep
+#   python performance_tests.py --sweep full --json results.json
+#   python performance_tests.py --rows 100000 --shapes dict,tuple \
+#       --methods superfast,multisort,multisort_dsu
+#   python performance_tests.py --json new.json --compare old.json
+# --compare exits with status 1 when a method is slower than in the older
+# results by more than --threshold.
+#########################################
+import argparse
+import gc
+import json
+import platform
+import sys
+import tracemalloc
+from collections import namedtuple
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from operator import attrgetter, itemgetter
+from random import Random
+from time import perf_counter
 from multisort import multisort, mscol, cmp_func, reversor
 import test_util as util
-pc = util.pc
-
-students = [
-     {'idx': 0, 'name': 'joh', 'grade': None, 'attend': 100},
-     {'idx': 1, 'name': 'jan', 'grade': 'a', 'attend': 80},
-     {'idx': 2, 'name': 'dav', 'grade': 'B', 'attend': 85},
-     {'idx': 3, 'name': 'bob', 'grade': 'C', 'attend': 85},
-     {'idx': 4, 'name': 'jim', 'grade': 'F', 'attend': 55},
-     {'idx': 5, 'name': 'joe', 'grade': None, 'attend': 55}
-]
-ITERATIONS = 10
-EXTRA_ROW = 1000
+try:
+    import pandas
+except ImportError:
+    pandas = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+SWEEPS = {
+    'quick': [1_000, 10_000, 100_000],
+    'full': [1_000, 10_000, 100_000, 1_000_000, 10_000_000],
+}
+SHAPES = ('dict', 'tuple', 'object', 'namedtuple', 'dataclass')
+ORDERS = ('random', 'sorted', 'nearly', 'reversed')
+# (name, value generator) in spec order. Columns alternate direction,
+# starting reversed
+COLUMNS = (
+    ('grade', lambda rnd: 'ABCDEF'[rnd.randrange(6)]),
+    ('attend', lambda rnd: rnd.randrange(101)),
+    ('score', lambda rnd: rnd.random()),
+    ('name', lambda rnd: f"s{rnd.randrange(100_000):05d}"),
+)
+FIELDS = ['idx'] + [name for (name, _) in COLUMNS]
+# Methods that are O(n log n) Python level comparisons, capped in rows
+SLOW_METHODS = ('cmp_func', 'reversor', 'multisort_multipass')
+
+StudentNT = namedtuple('StudentNT', FIELDS)
+
+
+@dataclass
+class StudentDC:
+    idx: int
+    grade: str
+    attend: int
+    score: float
+    name: str
+
+
+class Student():
+    def __init__(self, idx, grade, attend, score, name):
+        self.idx = idx
+        self.grade = grade
+        self.attend = attend
+        self.score = score
+        self.name = name
 
 
 def main():
-    results = asyncio.get_event_loop().run_until_complete(run_tests())
-    rrows = []
-    for result in results:
-        if isinstance(result, Exception): 
-            raise result
-        rrows.append(result)
-
-    rrows = multisort(rrows, 1)
-    table = util.quickTT(['test', 's/iter'])
-    for rrow in rrows:
-        table.add_row([rrow[0], f"{(rrow[1] / ITERATIONS):.7f}"])
-    print("Summary for {0} iteration{1} with {2} rows:\n{3}\n".format(
-          ITERATIONS,
-          's' if ITERATIONS > 1 else '',
-          len(students),
-          table.draw()))
-
-
-async def run_tests():
-    global students
-
-    # Add an additional number of records for testing
-    if EXTRA_ROW > 0:
-        for i in range(1, EXTRA_ROW+1):
-            students.append({'idx': len(students),
-                             'name': 'rnd',
-                             'grade': 'ABCDEF'[randint(0, 5)],
-                             'attend': randint(0, 100)})
-
-    coroutines = [
-        run_cmp_func(students[:]),
-        run_multisort(students[:]),
-        run_multisort_noclean(students[:]),
-        run_reversor(students[:]),
-        run_pandas(students[:]),
-        superfast(students[:]),
-        superfast_clean(students[:]),
-        superfast_lambda(students[:]),
-    ]
-    res = await asyncio.gather(*coroutines, return_exceptions=True)
-
-    return res
-
-
-async def run_cmp_func(rows):
-    sw = util.StopWatch()
-
-    def cmp_student(a, b):
-        k = 'grade'
-        va = a[k]
-        vb = b[k]
-        if va != vb:
+    args = parse_args()
+    methods = [m for m in args.methods.split(',') if m]
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        sys.exit(f"Unknown methods: {sorted(unknown)}."
+                 f" Expecting some of: {list(METHODS)}")
+
+    meta = get_meta()
+    pc(f"multisort benchmark on Python {meta['python']}"
+       f" ({meta['platform']})")
+    results = []
+    for case in get_cases(args):
+        results.extend(run_case(case, methods, args))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=1)
+        pc(f"Results written to {args.json}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if compare(old['results'], results, args.threshold):
+            sys.exit(1)
+
+
+def parse_args():
+    ap = argparse.ArgumentParser(description='multisort benchmark suite')
+    ap.add_argument('--sweep', choices=SWEEPS, default='quick',
+                    help='preset row counts (default quick)')
+    ap.add_argument('--rows', type=_int_list,
+                    help='row counts, overrides --sweep. eg. 1000,1e6')
+    ap.add_argument('--shapes', default=','.join(SHAPES),
+                    help='row shapes (default all)')
+    ap.add_argument('--cols', type=_int_list, default=[1, 2, 4],
+                    help=f'spec column counts, 1 to {len(COLUMNS)}'
+                         ' (default 1,2,4)')
+    ap.add_argument('--none', type=_float_list, default=[0.0, 0.2],
+                    help='fraction of None values (default 0,0.2)')
+    ap.add_argument('--orders', default='random,nearly',
+                    help=f"row orders, some of {','.join(ORDERS)}"
+                         " (default random,nearly)")
+    ap.add_argument('--methods', default=','.join(DEFAULT_METHODS),
+                    help=f"methods, some of {','.join(METHODS)}")
+    ap.add_argument('--repeat', type=int, default=5,
+                    help='timed runs per method, best is kept. Reduced for'
+                         ' large row counts (default 5)')
+    ap.add_argument('--slow-max-rows', type=int, default=100_000,
+                    help=f"skip {', '.join(SLOW_METHODS)} above this row"
+                         " count (default 100000)")
+    ap.add_argument('--no-memory', action='store_true',
+                    help='skip the tracemalloc peak memory run')
+    ap.add_argument('--no-check', action='store_true',
+                    help='skip checking results against superfast')
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--json', help='write results to this file')
+    ap.add_argument('--compare', help='older JSON results to compare with')
+    ap.add_argument('--threshold', type=float, default=0.10,
+                    help='slowdown reported as a regression (default 0.10)')
+    args = ap.parse_args()
+    args.rows = args.rows or SWEEPS[args.sweep]
+    args.shapes = [s for s in args.shapes.split(',') if s]
+    args.orders = [o for o in args.orders.split(',') if o]
+    assert set(args.shapes) <= set(SHAPES), f"Invalid shapes: {args.shapes}"
+    assert set(args.orders) <= set(ORDERS), f"Invalid orders: {args.orders}"
+    assert all(1 <= c <= len(COLUMNS) for c in args.cols), \
+        f"Invalid cols: {args.cols}"
+    return args
+
+
+def _int_list(s):
+    return [int(float(v)) for v in s.split(',') if v]
+
+
+def _float_list(s):
+    return [float(v) for v in s.split(',') if v]
+
+
+def get_meta() -> dict:
+    try:
+        from importlib.metadata import version
+        ms_version = version('multisort')
+    except Exception:  # not installed, or Python < 3.8
+        ms_version = None
+    return {
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'multisort': ms_version,
+        'numpy': getattr(numpy, '__version__', None),
+        'pandas': getattr(pandas, '__version__', None),
+    }
+
+
+def get_cases(args):
+    for n in args.rows:
+        for shape in args.shapes:
+            for ncols in args.cols:
+                for none in args.none:
+                    for order in args.orders:
+                        yield {'rows': n, 'shape': shape, 'cols': ncols,
+                               'none': none, 'order': order}
+
+
+# make_rows - Rows for case, built fresh so no case sees another's sorts
+def make_rows(case, seed) -> list:
+    rnd = Random(seed)
+    none = case['none']
+    gens = [gen for (_, gen) in COLUMNS]
+    recs = [(i, *[None if none and rnd.random() < none else gen(rnd)
+                  for gen in gens]) for i in range(case['rows'])]
+
+    shape = case['shape']
+    if shape == 'dict':
+        rows = [dict(zip(FIELDS, rec)) for rec in recs]
+    elif shape == 'tuple':
+        rows = recs
+    elif shape == 'object':
+        rows = [Student(*rec) for rec in recs]
+    elif shape == 'namedtuple':
+        rows = [StudentNT(*rec) for rec in recs]
+    else:
+        rows = [StudentDC(*rec) for rec in recs]
+    del recs
+
+    order = case['order']
+    if order != 'random':
+        rows = superfast(rows, get_spec(case))
+        if order == 'reversed':
+            rows.reverse()
+        elif order == 'nearly':  # 1% of rows moved
+            for _ in range(max(1, len(rows) // 100)):
+                rows.insert(rnd.randrange(len(rows)),
+                            rows.pop(rnd.randrange(len(rows))))
+    return rows
+
+
+# get_spec - [(key, reverse)] for the case. Keys are indexes for tuple rows
+def get_spec(case) -> list:
+    spec = []
+    for (i, (name, _)) in enumerate(COLUMNS[:case['cols']]):
+        key = FIELDS.index(name) if case['shape'] == 'tuple' else name
+        spec.append((key, i % 2 == 0))
+    return spec
+
+
+def _get_for(rows, key):
+    if isinstance(key, int) or (rows and isinstance(rows[0], dict)):
+        return itemgetter(key)
+    return attrgetter(key)
+
+
+# Methods. Each takes (rows, spec) with spec as [(key, reverse)]
+
+# superfast - Hand written baseline: one stable sort per column, last
+# column first, on a None safe key
+def superfast(rows, spec):
+    rows_sorted = rows[:]
+    for (key, reverse) in reversed(spec):
+        get = _get_for(rows, key)
+
+        def sort_key(row):
+            v = get(row)
+            return v is None, v
+        rows_sorted.sort(key=sort_key, reverse=reverse)
+    return rows_sorted
+
+
+def run_cmp_func(rows, spec):
+    gets = [(_get_for(rows, key), reverse) for (key, reverse) in spec]
+
+    def cmp_rows(a, b):
+        for (get, reverse) in gets:
+            va = get(a)
+            vb = get(b)
+            if va == vb:
+                continue
             if va is None:
-                return -1
-            if vb is None:
-                return 1
-            return -1 if va > vb else 1
-        k = 'attend'
-        va = a[k]
-        vb = b[k]
-        if va != vb:
-            return -1 if va < vb else 1
+                res = 1
+            elif vb is None:
+                res = -1
+            else:
+                res = -1 if va < vb else 1
+            return -res if reverse else res
         return 0
-
-    for i in range(0, ITERATIONS):
-        _ = sorted(rows, key=cmp_func(cmp_student), reverse=True)
-
-    return ('cmp_func', sw.elapsed(prec=7))
-
-
-async def run_multisort(rows):
-    sw = util.StopWatch()
-    for i in range(0, ITERATIONS):
-        def clean_grade(v): return v.lower()
-        _ = multisort(rows, [
-                mscol('grade', reverse=True, clean=clean_grade),
-                mscol('attend', reverse=True),
-        ], reverse=True)
-    return ('multisort w/ clean', sw.elapsed(prec=7))
-
-
-async def run_multisort_noclean(rows):
-    sw = util.StopWatch()
-    for i in range(0, ITERATIONS):
-        _ = multisort(rows, [
-                mscol('grade', reverse=True),
-                mscol('attend', reverse=True),
-        ], reverse=True)
-    return ('multisort noclean', sw.elapsed(prec=7))
-
-
-async def run_reversor(rows):
-    sw = util.StopWatch()
-    for i in range(0, ITERATIONS):
-        _ = sorted(rows, key=lambda o: (
-                     reversor(None if o['grade'] is None else
-                              o['grade'].lower()),
-                     reversor(o['attend'])
-        ), reverse=True)
-    return ('reversor', sw.elapsed(prec=7))
-
-
-async def run_pandas(rows):
-    sw = util.StopWatch()
-
-    for i in range(0, ITERATIONS):
-        df = pandas.DataFrame(rows[:])
-        df.sort_values(by=['grade', 'attend'],
-                       ascending=[False, False],
-                       na_position='last')
-        # d_rows_sorted = list(df.T.to_dict().values())
-
-    return ('pandas', sw.elapsed(prec=7))
-
-
-async def superfast(students):
-    sw = util.StopWatch()
-
-    def key_grade(student):
-        grade = student['grade']
-        return grade is None, grade
-
-    def key_attend(student):
-        attend = student['attend']
-        return attend is None, attend
-    students_sorted = sorted(students, key=key_attend)
-    students_sorted.sort(key=key_grade, reverse=True)
-
-    return ('superfast', sw.elapsed(prec=7))
-
-
-async def superfast_lambda(students):
-    sw = util.StopWatch()
-    students_sorted = sorted(students, key=lambda r: (r['grade'] is None,
-                                                      r['grade'],))
-    students_sorted.sort(key=lambda r: (r['attend'] is None, r['attend'],), 
-                         reverse=True)
-
-    return ('superfast_lambda', sw.elapsed(prec=7))
-
-
-async def superfast_clean(students):
-    sw = util.StopWatch()
-
-    def key_grade(student):
-        grade = student['grade']
-        if grade is None:
-            return True, None
-        else:
-            return False, grade.upper()
-
-    def key_attend(student):
-        return student['attend']
-    students_sorted = sorted(students, key=key_attend)
-    students_sorted.sort(key=key_grade, reverse=True)
-
-    return ('superfast w/ clean', sw.elapsed(prec=7))
+    return sorted(rows, key=cmp_func(cmp_rows))
+
+
+def run_reversor(rows, spec):
+    gets = [(_get_for(rows, key), reverse) for (key, reverse) in spec]
+
+    def sort_key(row):
+        k = []
+        for (get, reverse) in gets:
+            v = get(row)
+            k.append(reversor(v) if reverse else (v is None, v))
+        return k
+    return sorted(rows, key=sort_key)
+
+
+def _run_engine(engine):
+    def run(rows, spec):
+        return multisort(rows, [mscol(key, reverse) for (key, reverse)
+                                in spec], engine=engine)
+    run.__name__ = f"multisort_{engine}"
+    return run
+
+
+# run_pandas - sort_values on a prebuilt DataFrame, so only the sort is
+# timed. Speed reference only: na_position can not put None first for
+# reversed columns the way multisort does
+def run_pandas(df, spec):
+    return df.sort_values(by=[str(key) for (key, _) in spec],
+                          ascending=[not reverse for (_, reverse) in spec],
+                          na_position='last', kind='stable')
+
+
+def to_frame(rows):
+    if rows and isinstance(rows[0], dict):
+        df = pandas.DataFrame(rows)
+    elif rows and isinstance(rows[0], tuple) \
+            and not hasattr(rows[0], '_fields'):
+        df = pandas.DataFrame(rows)
+    else:
+        df = pandas.DataFrame([vars(r) if hasattr(r, '__dict__')
+                               else r._asdict() for r in rows])
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+
+METHODS = {
+    'superfast': superfast,
+    'multisort': _run_engine('compiled'),
+    'multisort_dsu': _run_engine('dsu'),
+    'multisort_encoded': _run_engine('encoded'),
+    'multisort_numpy': _run_engine('numpy'),
+    'multisort_multipass': _run_engine('multipass'),
+    'cmp_func': run_cmp_func,
+    'reversor': run_reversor,
+    'pandas': run_pandas,
+}
+DEFAULT_METHODS = [m for m in METHODS if numpy or m != 'multisort_numpy']
+
+
+def run_case(case, methods, args) -> list:
+    n = case['rows']
+    rows = make_rows(case, args.seed)
+    spec = get_spec(case)
+    repeat = args.repeat if n <= 100_000 else max(1, args.repeat // 3) \
+        if n <= 1_000_000 else 1
+    expected = None if args.no_check else superfast(rows, spec)
+
+    results = []
+    for method in methods:
+        rec = dict(case, method=method, repeat=repeat, secs=None,
+                   ns_per_row=None, peak_bytes=None, note=None)
+        results.append(rec)
+        if method == 'pandas' and pandas is None:
+            rec['note'] = 'pandas not installed'
+            continue
+        if method == 'multisort_numpy' and numpy is None:
+            rec['note'] = 'numpy not installed'
+            continue
+        if method in SLOW_METHODS and n > args.slow_max_rows:
+            rec['note'] = f"over --slow-max-rows ({args.slow_max_rows})"
+            continue
+
+        fn = METHODS[method]
+        data = to_frame(rows) if method == 'pandas' else rows
+        (secs, out) = _time(fn, data, spec, repeat)
+        rec['secs'] = secs
+        rec['ns_per_row'] = secs / max(n, 1) * 1e9
+        if expected is not None and method != 'pandas' \
+                and list(map(id, out)) != list(map(id, expected)):
+            rec['note'] = 'result differs from superfast'
+        del out
+        if not args.no_memory:
+            rec['peak_bytes'] = _peak_memory(fn, data, spec)
+        del data
+
+    base = {r['method']: r['secs'] for r in results if r['secs']}
+    for rec in results:
+        for (ref, field) in (('superfast', 'vs_superfast'),
+                             ('pandas', 'vs_pandas')):
+            rec[field] = base[ref] / rec['secs'] \
+                if rec['secs'] and base.get(ref) else None
+
+    print_case(case, results)
+    return results
+
+
+def _time(fn, data, spec, repeat) -> tuple:
+    best = None
+    out = None
+    gc.collect()
+    for _ in range(repeat):
+        del out
+        t0 = perf_counter()
+        out = fn(data, spec)
+        secs = perf_counter() - t0
+        best = secs if best is None else min(best, secs)
+    return best, out
+
+
+def _peak_memory(fn, data, spec) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        out = fn(data, spec)
+        peak = tracemalloc.get_traced_memory()[1] - base
+        del out
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def print_case(case, results):
+    table = util.quickTT(['method', 's', 'ns/row', 'peak MiB',
+                          'vs superfast', 'vs pandas', 'note'])
+    for rec in results:
+        table.add_row([
+            rec['method'],
+            _fmt(rec['secs'], '.5f'),
+            _fmt(rec['ns_per_row'], '.0f'),
+            _fmt(rec['peak_bytes'] and rec['peak_bytes'] / 2**20, '.2f'),
+            _fmt(rec['vs_superfast'], '.2f', 'x'),
+            _fmt(rec['vs_pandas'], '.2f', 'x'),
+            rec['note'] or ''])
+    pc("rows: {rows}, shape: {shape}, cols: {cols}, none: {none},"
+       " order: {order}".format(**case))
+    pc(table.draw() + '\n')
+
+
+def _fmt(v, spec, suffix=''):
+    return '-' if v is None else format(v, spec) + suffix
+
+
+# compare - Print timing changes against older results. Returns True when
+# any method got slower by more than threshold
+def compare(old_results, new_results, threshold) -> bool:
+    def case_key(r):
+        return (r['rows'], r['shape'], r['cols'], r['none'], r['order'],
+                r['method'])
+    old = {case_key(r): r for r in old_results if r.get('secs')}
+    table = util.quickTT(['rows', 'shape', 'cols', 'none', 'order',
+                          'method', 'old s', 'new s', 'change'])
+    regressed = False
+    for r in new_results:
+        o = old.get(case_key(r))
+        if not o or not r['secs']:
+            continue
+        change = r['secs'] / o['secs'] - 1
+        flag = ''
+        if change > threshold:
+            (flag, regressed) = (' REGRESSION', True)
+        table.add_row([*case_key(r), f"{o['secs']:.5f}", f"{r['secs']:.5f}",
+                       f"{change:+.1%}{flag}"])
+    pc(f"Compared with older results (threshold {threshold:.0%}):\n"
+       f"{table.draw()}\n")
+    return regressed
+
+
+def pc(*args):
+    util.pc(*args)
+    sys.stdout.flush()
 
 
 if __name__ == '__main__':
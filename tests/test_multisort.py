@@ -1,7 +1,25 @@
+import asyncio
+import copy
+import os
+import pickle
 import sys
+import tempfile
 import unittest
-from multisort import multisort, mscol
+from array import array
+from collections import namedtuple
+from dataclasses import dataclass
+from decimal import Decimal
+from multisort import multisort, msorted, mscol, msort_topk, \
+    multisort_external, multisort_merge, reversor, ReversedView, SortPlan, \
+    SortStats, MultiSortedList, SortSession, multisort_argsort, \
+    apply_permutation, Columns, amultisort
+from multisort.multisort import MultiSortError, MSKeyError
 import test_util as util
+try:
+    import pyarrow as pa
+except ImportError:  # optional, used by ArrowTests
+    pa = None
+mst = sys.modules['multisort.multisort']
 pc = util.pc
 
 FAILFAST = True
@@ -186,6 +204,979 @@ class ObjectTests(MultiSortBase):
         self._run_tests(rows_as, row_as, rows_in)
 
 
+class EngineTests(unittest.TestCase):
+    # EngineTests.test_engines_match_multipass
+    def test_engines_match_multipass(self):
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                multipass = list(multisort(STUDENTS_BASE, spec,
+                                           reverse=reverse,
+                                           engine='multipass'))
+                for engine in ('compiled', 'dsu'):
+                    rows_sorted = multisort(STUDENTS_BASE, spec,
+                                            reverse=reverse, engine=engine)
+                    self.assertEqual(list(rows_sorted), multipass)
+
+    # EngineTests.test_dsu_stats
+    def test_dsu_stats(self):
+        stats = SortStats()
+        multisort(STUDENTS_BASE, MSORTED_TESTS[0][1], engine='dsu',
+                  stats=stats)
+        self.assertEqual(stats.engine, 'dsu')
+        self.assertEqual(stats.rows, len(STUDENTS_BASE))
+        self.assertGreater(stats.clean_secs, 0)
+        self.assertGreater(stats.key_bytes, 0)
+
+    # EngineTests.test_compiled_mixed_direction_wrapped
+    def test_compiled_mixed_direction_wrapped(self):
+        spec = [mscol(COL_ATTEND), mscol(COL_NAME, reverse=True)]
+        self.assertEqual([r[COL_IDX] for r in multisort(STUDENTS_BASE, spec)],
+                         [4, 5, 1, 2, 3, 0])
+
+    # EngineTests.test_reversed_decimal_exact
+    def test_reversed_decimal_exact(self):
+        # differ past the default 28 digit decimal context precision
+        rows = [{'k': 1, 'd': Decimal('1.00000000000000000000000000001')},
+                {'k': 1, 'd': Decimal('1.00000000000000000000000000002')}]
+        for engine in mst.ENGINES:
+            rows_sorted = multisort(rows, ['k', mscol('d', reverse=True)],
+                                    engine=engine)
+            self.assertEqual(rows_sorted, [rows[1], rows[0]])
+
+
+class ProfileTests(unittest.TestCase):
+    # ProfileTests.test_profile_counts
+    def test_profile_counts(self):
+        for (expected, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                stats = SortStats(profile=True)
+                rows_sorted = multisort(STUDENTS_BASE, spec, reverse=reverse,
+                                        stats=stats)
+                self.assertEqual(rows_sorted,
+                                 multisort(STUDENTS_BASE, spec,
+                                           reverse=reverse))
+                n_cols = len(stats.columns)
+                self.assertEqual(stats.engine, 'multipass')
+                self.assertEqual(stats.passes, n_cols)
+                self.assertEqual(stats.key_calls,
+                                 n_cols * len(STUDENTS_BASE))
+                self.assertEqual(stats.errors, 0)
+        stats = SortStats(profile=True)
+        multisort(STUDENTS_BASE, MSORTED_TESTS[0][1], stats=stats)
+        self.assertEqual(stats.clean_calls, 5)  # None is not cleaned
+        self.assertEqual([c['clean_calls'] for c in stats.columns], [5, 0])
+        self.assertGreater(stats.columns[0]['secs'], 0)
+
+    # ProfileTests.test_profile_lookups
+    def test_profile_lookups(self):
+        rows = [{'a': 2, 'b': 1}, {'a': 1}, {'a': 1, 'b': 0}]
+        stats = SortStats(profile=True)
+        rows_sorted = multisort(rows, ['a', mscol('b', required=False,
+                                                  default=5)], stats=stats)
+        self.assertEqual(rows_sorted, [rows[2], rows[1], rows[0]])
+        self.assertEqual(stats.lookup_fallbacks, 1)
+        self.assertEqual(stats.attr_lookups, 1)
+        self.assertEqual(stats.defaults, 1)
+        self.assertEqual(stats.as_metrics()['multisort.col.b.defaults'], 1)
+
+    # ProfileTests.test_callback
+    def test_callback(self):
+        seen = []
+        stats = SortStats(callback=seen.append)
+        multisort(STUDENTS_BASE, COL_GRADE, stats=stats)
+        self.assertEqual(seen, [stats])
+        self.assertNotIn('passes', stats.as_dict())
+
+        stats = SortStats(profile=True, callback=seen.append)
+        with self.assertRaises(MultiSortError):
+            multisort([{'a': 1}, {'b': 2}], 'a', stats=stats)
+        self.assertEqual(seen[-1], stats)
+        self.assertEqual(stats.errors, 1)
+
+    # ProfileTests.test_reused_stats
+    def test_reused_stats(self):
+        seen = []
+        stats = SortStats(callback=lambda s: seen.append(s.as_dict()))
+        spec = MSORTED_TESTS[0][1]  # clean callback on grade
+        multisort(STUDENTS_BASE, spec, engine='numpy', stats=stats)
+        multisort(STUDENTS_BASE, spec, engine='dsu', stats=stats)
+        multisort(STUDENTS_BASE[::-1], COL_IDX, assume_runs=True,
+                  stats=stats)
+        multisort(STUDENTS_BASE, COL_IDX, stats=stats)
+        self.assertIsNotNone(seen[0]['fallback'])
+        self.assertIsNone(seen[1]['fallback'])
+        self.assertGreater(seen[1]['clean_secs'], 0)
+        self.assertGreater(seen[2]['inversions'], 0)
+        self.assertEqual(seen[3], dict(SortStats().as_dict(),
+                                       engine='compiled',
+                                       rows=len(STUDENTS_BASE),
+                                       total_secs=seen[3]['total_secs']))
+
+
+class PathKeyTests(unittest.TestCase):
+    ROWS = [{'c': {'a': {'zip': 3}}, 'items': [{'p': 2}]},
+            {'c': {'a': None}, 'items': []},
+            {'c': {}, 'items': [{'p': 1}]},
+            {'c': {'a': {'zip': 1}}, 'items': [{'p': 5}]}]
+
+    def _idxs(self, rows_sorted):
+        return [self.ROWS.index(r) for r in rows_sorted]
+
+    # PathKeyTests.test_dotted_and_tuple_paths
+    def test_dotted_and_tuple_paths(self):
+        for engine in mst.ENGINES:
+            for key in ('c.a.zip', ('c', 'a', 'zip')):
+                spec = [mscol(key, reverse=True, required=False, default=2)]
+                self.assertEqual(
+                    self._idxs(multisort(self.ROWS, spec, engine=engine)),
+                    [0, 1, 2, 3])
+        self.assertEqual(self._idxs(multisort(
+            self.ROWS, [mscol('items.0.p', required=False)])), [2, 0, 3, 1])
+
+    # PathKeyTests.test_required
+    def test_required(self):
+        with self.assertRaises(MultiSortError):
+            multisort(self.ROWS, 'c.a.zip')
+        rows = [self.ROWS[0], self.ROWS[1], self.ROWS[3]]
+        self.assertEqual(multisort(rows, 'c.a.zip'),
+                         [self.ROWS[3], self.ROWS[0], self.ROWS[1]])
+
+    # PathKeyTests.test_objects_and_dotted_dict_keys
+    def test_objects_and_dotted_dict_keys(self):
+        rows = [Student(i, None, None, None) for i in range(3)]
+        for (row, zip_) in zip(rows, (2, 1, 3)):
+            row.name = Student(row.idx, zip_, None, None)
+        self.assertEqual([r.idx for r in multisort(rows, 'name.name')],
+                         [1, 0, 2])
+        self.assertEqual(multisort([{'x.y': 2}, {'x.y': 1}], 'x.y'),
+                         [{'x.y': 1}, {'x.y': 2}])
+
+    # PathKeyTests.test_exact_keys_first
+    def test_exact_keys_first(self):
+        for key in (('a', 'b'), 'a.b'):
+            rows = [{key: 2}, {key: 1}, {key: 3, 'a': {'b': 0}}]
+            for engine in mst.ENGINES:
+                self.assertEqual(
+                    multisort(rows, [mscol(key)], engine=engine),
+                    [rows[1], rows[0], rows[2]])
+            # the fast getter for dict rows does not raise for exact keys
+            get = mst._col_getter(key, None, True, dict)[0]
+            self.assertEqual([get(r) for r in rows], [2, 1, 3])
+
+
+class MsortedTests(unittest.TestCase):
+    SPEC = [(COL_GRADE, {'clean': clean_grade}), (COL_ATTEND, {})]
+
+    # MsortedTests.test_reverse_keeps_none_last
+    def test_reverse_keeps_none_last(self):
+        self.assertEqual([r[COL_IDX] for r in msorted(STUDENTS_BASE,
+                                                      self.SPEC)],
+                         [2, 0, 5, 1, 3, 4])
+        self.assertEqual([r[COL_IDX] for r in msorted(STUDENTS_BASE,
+                                                      self.SPEC,
+                                                      reverse=True)],
+                         [3, 1, 5, 0, 2, 4])
+
+    # MsortedTests.test_iterables
+    def test_iterables(self):
+        expected = msorted(STUDENTS_BASE, self.SPEC)
+        self.assertEqual(msorted(iter(STUDENTS_BASE), self.SPEC), expected)
+        self.assertEqual(msorted((r for r in STUDENTS_BASE), self.SPEC),
+                         expected)
+        self.assertEqual(msorted(r[COL_ATTEND] for r in STUDENTS_BASE),
+                         [55, 70, 80, 85, 85, 100])
+
+    # MsortedTests.test_options
+    def test_options(self):
+        rows = [{'a': 2}, {'a': None}, {}, {'a': 1}]
+        self.assertEqual(msorted(rows, ('a', {'reverse': True,
+                                              'required': False,
+                                              'default': 5})),
+                         [rows[1], rows[2], rows[0], rows[3]])
+        with self.assertRaises(AssertionError):
+            msorted(rows, [('a', {'revers': True})])
+        with self.assertRaises(MultiSortError):
+            msorted(rows, [('a', {'reverse': True})])
+
+
+class ReverseTests(unittest.TestCase):
+    # ReverseTests.test_reverse_returns_list
+    def test_reverse_returns_list(self):
+        for (expected, spec) in MSORTED_TESTS:
+            for engine in mst.ENGINES:
+                rows_sorted = multisort(STUDENTS_BASE, spec, reverse=True,
+                                        engine=engine)
+                self.assertIsInstance(rows_sorted, list)
+                self.assertEqual(tuple(r[COL_IDX] for r in rows_sorted),
+                                 tuple(reversed(expected)))
+
+    # ReverseTests.test_reverse_view
+    def test_reverse_view(self):
+        (expected, spec) = MSORTED_TESTS[0]
+        expected = tuple(reversed(expected))
+        rows_sorted = multisort(STUDENTS_BASE, spec, reverse=True, view=True)
+        self.assertIsInstance(rows_sorted, ReversedView)
+        self.assertEqual(len(rows_sorted), len(expected))
+        self.assertEqual(rows_sorted[0][COL_IDX], expected[0])
+        self.assertEqual(rows_sorted[-1][COL_IDX], expected[-1])
+        self.assertEqual([r[COL_IDX] for r in rows_sorted[1:4]],
+                         list(expected[1:4]))
+        self.assertEqual([r[COL_IDX] for r in rows_sorted[::-2]],
+                         list(expected[::-2]))
+        self.assertEqual(tuple(r[COL_IDX] for r in rows_sorted), expected)
+        self.assertEqual(rows_sorted, multisort(STUDENTS_BASE, spec,
+                                                reverse=True))
+        with self.assertRaises(IndexError):
+            rows_sorted[len(expected)]
+
+
+class InplaceTests(unittest.TestCase):
+    # InplaceTests.test_inplace_matches_multisort
+    def test_inplace_matches_multisort(self):
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                for engine in mst.ENGINES:
+                    rows = STUDENTS_BASE[:]
+                    rows_sorted = multisort(rows, spec, reverse=reverse,
+                                            engine=engine, inplace=True)
+                    self.assertIs(rows_sorted, rows)
+                    self.assertEqual(rows, list(multisort(
+                        STUDENTS_BASE, spec, reverse=reverse)))
+
+    # InplaceTests.test_inplace_no_spec
+    def test_inplace_no_spec(self):
+        rows = [1, 4, 3, 6, 5]
+        self.assertIs(multisort(rows, reverse=True, inplace=True), rows)
+        self.assertEqual(rows, [6, 5, 4, 3, 1])
+
+    # InplaceTests.test_inplace_error
+    def test_inplace_error(self):
+        rows = [{'a': 1}, {'b': 2}]
+        with self.assertRaises(MultiSortError):
+            multisort(rows, 'a', inplace=True)
+
+
+class AssumeRunsTests(unittest.TestCase):
+    # AssumeRunsTests.test_assume_runs_matches_multisort
+    def test_assume_runs_matches_multisort(self):
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                expected = multisort(STUDENTS_BASE, spec, reverse=reverse)
+                for rows in (STUDENTS_BASE, expected,
+                             multisort(STUDENTS_BASE, spec,
+                                       reverse=not reverse)):
+                    expected = multisort(rows, spec, reverse=reverse)
+                    self.assertEqual(multisort(rows, spec, reverse=reverse,
+                                               assume_runs=True), expected)
+                    rows = list(rows)
+                    multisort(rows, spec, reverse=reverse, inplace=True,
+                              assume_runs=True)
+                    self.assertEqual(rows, expected)
+
+    # AssumeRunsTests.test_assume_runs_stats
+    def test_assume_runs_stats(self):
+        spec = [mscol(COL_GRADE, reverse=True), COL_ATTEND]
+        rows = multisort(STUDENTS_BASE, spec)
+        stats = SortStats()
+        rows_sorted = multisort(rows, spec, stats=stats, assume_runs=True)
+        self.assertIsNot(rows_sorted, rows)
+        self.assertEqual(rows_sorted, rows)
+        self.assertEqual((stats.presorted, stats.sorted_prefix,
+                          stats.inversions), (True, 6, 0))
+
+        rows[1], rows[4] = rows[4], rows[1]
+        stats = SortStats()
+        multisort(rows, spec, engine='multipass', stats=stats,
+                  assume_runs=True)
+        self.assertEqual((stats.engine, stats.presorted,
+                          stats.sorted_prefix, stats.inversions),
+                         ('compiled', False, 2, 2))
+
+
+class ReversorTests(unittest.TestCase):
+    # ReversorTests.test_reversor_order
+    def test_reversor_order(self):
+        # grade descending with None last, then attend descending
+        rows_sorted = sorted(STUDENTS_BASE, key=lambda r: (
+            reversor(None if r[COL_GRADE] is None else r[COL_GRADE].upper()),
+            reversor(r[COL_ATTEND])))
+        self.assertEqual([r[COL_IDX] for r in rows_sorted],
+                         [3, 1, 5, 0, 2, 4])
+
+    # ReversorTests.test_reversor_str_prefix_and_nul
+    def test_reversor_str_prefix_and_nul(self):
+        values = ['a', 'ab', 'a\x00', '', 'b', None, '\ud800', 'a\x00b']
+        expected = sorted([v for v in values if v is not None],
+                          reverse=True) + [None]
+        self.assertEqual(sorted(values, key=reversor), expected)
+
+    # ReversorTests.test_reversor_obj
+    def test_reversor_obj(self):
+        values = [3, 2.5, True, 'b', 'a\x00', '\ud800', Decimal('1.5'),
+                  (1, 2), None]
+        for v in values:
+            r = reversor(v)
+            self.assertIsInstance(r, reversor)
+            self.assertIs(type(r.obj), type(v))
+            self.assertEqual(r.obj, v)
+        self.assertLess(reversor(2), reversor(True))
+        self.assertEqual(reversor(1), reversor(True))
+
+    # ReversorTests.test_reversor_pickle_and_copy
+    def test_reversor_pickle_and_copy(self):
+        for v in (5, 'b', True, Decimal('1.5'), (1, 2), None):
+            for r in (pickle.loads(pickle.dumps(reversor(v))),
+                      copy.copy(reversor(v)), copy.deepcopy(reversor(v))):
+                self.assertIsInstance(r, reversor)
+                self.assertEqual(r, reversor(v))
+                self.assertEqual(r.obj, v)
+
+    # ReversorTests.test_reversor_decimal_exact
+    def test_reversor_decimal_exact(self):
+        a = Decimal('1.00000000000000000000000000001')
+        b = Decimal('1.00000000000000000000000000002')
+        self.assertEqual(sorted([a, b], key=reversor), [b, a])
+        self.assertEqual(reversor(a).obj, a)
+
+
+class SortPlanTests(unittest.TestCase):
+    # SortPlanTests.test_plan_matches_multisort
+    def test_plan_matches_multisort(self):
+        for (expected, spec) in MSORTED_TESTS:
+            plan = SortPlan(spec)
+            rows_sorted = plan.sorted(STUDENTS_BASE)
+            self.assertEqual(tuple(r[COL_IDX] for r in rows_sorted), expected)
+
+            rows = STUDENTS_BASE[:]
+            plan.sort(rows)
+            self.assertEqual(rows, rows_sorted)
+
+    # SortPlanTests.test_plan_cache_by_type
+    def test_plan_cache_by_type(self):
+        # [1.0] and [True] equal [1], but are not valid specs
+        multisort(STUDENTS_BASE, [1])
+        for spec in ([1.0], [True]):
+            with self.assertRaises(AssertionError):
+                multisort(STUDENTS_BASE, spec)
+
+
+class MultiSortedListTests(unittest.TestCase):
+    # MultiSortedListTests.test_add_matches_multisort
+    def test_add_matches_multisort(self):
+        for (_, spec) in MSORTED_TESTS:
+            for load in (2, 1000):
+                rows_sorted = MultiSortedList(spec, load=load)
+                for (i, row) in enumerate(STUDENTS_BASE):
+                    rows_sorted.add(row)
+                    self.assertEqual(list(rows_sorted),
+                                     multisort(STUDENTS_BASE[:i + 1], spec))
+                self.assertEqual(list(reversed(rows_sorted)),
+                                 multisort(STUDENTS_BASE, spec,
+                                           reverse=True))
+
+    # MultiSortedListTests.test_bulk_add_remove_update
+    def test_bulk_add_remove_update(self):
+        spec = [mscol(COL_GRADE, reverse=True), COL_ATTEND]
+        rows_sorted = MultiSortedList(spec, STUDENTS_BASE[:2], load=2)
+        rows_sorted.bulk_add(STUDENTS_BASE[2:])
+        self.assertEqual(rows_sorted[:], multisort(STUDENTS_BASE, spec))
+        self.assertEqual(rows_sorted[-1], multisort(STUDENTS_BASE, spec)[-1])
+
+        rows_sorted.remove(STUDENTS_BASE[3])
+        self.assertNotIn(STUDENTS_BASE[3], rows_sorted)
+        with self.assertRaises(ValueError):
+            rows_sorted.remove(STUDENTS_BASE[3])
+
+        row_new = (6, 'ann', 'B', 75)
+        rows_sorted.update(STUDENTS_BASE[1], row_new)
+        rows = [row for row in STUDENTS_BASE if row[COL_IDX] not in (1, 3)]
+        self.assertEqual(list(rows_sorted),
+                         multisort(rows + [row_new], spec))
+        self.assertEqual(len(rows_sorted), 5)
+
+    # MultiSortedListTests.test_add_error
+    def test_add_error(self):
+        rows_sorted = MultiSortedList('grade', [{'grade': 'A'}])
+        with self.assertRaises(MultiSortError):
+            rows_sorted.add({'attend': 1})
+        self.assertEqual(len(rows_sorted), 1)
+
+    # MultiSortedListTests.test_slices
+    def test_slices(self):
+        rows = [(i,) for i in range(23)]
+        rows_sorted = MultiSortedList(0, rows[::-1], load=4)
+        bounds = (None, 0, 1, 3, 4, 5, 11, 22, 23, 30, -1, -4, -5, -30)
+        for start in bounds:
+            for stop in bounds:
+                for step in (None, 1, 2, 3, 5, -1, -2, -3, -5):
+                    sl = slice(start, stop, step)
+                    self.assertEqual(rows_sorted[sl], rows[sl])
+
+
+class SortSessionTests(unittest.TestCase):
+    # SortSessionTests.test_session_matches_multisort
+    def test_session_matches_multisort(self):
+        session = SortSession(STUDENTS_BASE)
+        for i in range(2):
+            for (_, spec) in MSORTED_TESTS:
+                for reverse in (False, True):
+                    self.assertEqual(session.sorted(spec, reverse),
+                                     multisort(STUDENTS_BASE, spec, reverse))
+        self.assertEqual(session.misses, 4)
+        self.assertGreater(session.hits, 0)
+
+    # SortSessionTests.test_session_missing_and_clean_none
+    def test_session_missing_and_clean_none(self):
+        rows = [{'v': 'b'}, {'v': ''}, {}, {'v': None}, {'v': 'a'}]
+        session = SortSession(rows)
+        for spec in ([mscol('v', required=False)],
+                     [mscol('v', required=False, default='c')],
+                     [mscol('v', clean=str.upper, required=False)],
+                     [mscol('v', reverse=True, clean=str.upper, default='z',
+                            required=False)]):
+            self.assertEqual(session.sorted(spec), multisort(rows, spec))
+
+        # A missing key, or None from clean, is reported as multisort() does
+        for spec in ('v', [mscol('v', clean=lambda v: v or None,
+                                 required=False)]):
+            with self.assertRaises(MultiSortError):
+                multisort(rows, spec)
+            with self.assertRaises(MultiSortError):
+                session.sorted(spec)
+
+    # SortSessionTests.test_session_eviction_and_invalidate
+    def test_session_eviction_and_invalidate(self):
+        rows = [dict(zip(STUDENT_COLS, row)) for row in STUDENTS_BASE]
+        session = SortSession(rows, max_bytes=200)
+        session.sorted(['grade', 'attend'])
+        self.assertLessEqual(session.cache_bytes, 200)
+        self.assertEqual(session.sorted(['attend']), multisort(rows, 'attend'))
+
+        session = SortSession(rows)
+        session.sorted(['grade', 'attend'])
+        rows[0]['attend'] = 0
+        session.invalidate('attend')
+        self.assertEqual(session.sorted(['attend']), multisort(rows, 'attend'))
+        session.invalidate()
+        self.assertEqual(session.cache_bytes, 0)
+
+
+@unittest.skipUnless(mst.np is not None, "requires numpy")
+class NumpyEngineTests(unittest.TestCase):
+    # NumpyEngineTests.test_numpy_matches_multipass
+    def test_numpy_matches_multipass(self):
+        specs = [[mscol(COL_GRADE, reverse=True), COL_ATTEND],
+                 [COL_ATTEND, mscol(COL_NAME, reverse=True)],
+                 [mscol(COL_GRADE, default='Z'), mscol(COL_IDX, True)]]
+        for spec in specs:
+            stats = SortStats()
+            rows_sorted = multisort(STUDENTS_BASE, spec, engine='numpy',
+                                    stats=stats)
+            self.assertEqual(stats.engine, 'numpy')
+            self.assertEqual(rows_sorted, multisort(STUDENTS_BASE, spec,
+                                                    engine='multipass'))
+
+    # NumpyEngineTests.test_numpy_fallback
+    def test_numpy_fallback(self):
+        stats = SortStats()
+        spec = MSORTED_TESTS[0][1]
+        rows_sorted = multisort(STUDENTS_BASE, spec, engine='numpy',
+                                stats=stats)
+        self.assertEqual(stats.engine, 'compiled')
+        self.assertIn('clean', stats.fallback)
+        self.assertEqual(tuple(r[COL_IDX] for r in rows_sorted),
+                         MSORTED_TESTS[0][0])
+
+
+class EncodedEngineTests(unittest.TestCase):
+    # EncodedEngineTests.test_encoded_matches_multipass
+    def test_encoded_matches_multipass(self):
+        specs = [[mscol(COL_GRADE, reverse=True), COL_ATTEND],
+                 [COL_ATTEND, mscol(COL_NAME, reverse=True)],
+                 [mscol(COL_GRADE, default='Z'), mscol(COL_IDX, True)]]
+        for spec in specs:
+            for reverse in (False, True):
+                stats = SortStats()
+                rows_sorted = multisort(STUDENTS_BASE, spec, reverse=reverse,
+                                        engine='encoded', stats=stats)
+                self.assertEqual(stats.engine, 'encoded')
+                self.assertEqual(rows_sorted,
+                                 multisort(STUDENTS_BASE, spec,
+                                           reverse=reverse,
+                                           engine='multipass'))
+
+    # EncodedEngineTests.test_encoded_numbers
+    def test_encoded_numbers(self):
+        rows = [{'v': v} for v in (None, 2, -0.0, 0, -1.5, True, float('inf'),
+                                   -2**63, 2**53, float('-inf'), 1e300)]
+        for col_reverse in (False, True):
+            spec = [('v', col_reverse)]
+            stats = SortStats()
+            rows_sorted = multisort(rows, spec, engine='encoded', stats=stats)
+            self.assertEqual(stats.engine, 'encoded')
+            self.assertEqual([id(r) for r in rows_sorted],
+                             [id(r) for r in multisort(rows, spec,
+                                                       engine='multipass')])
+
+    # EncodedEngineTests.test_encoded_fallback
+    def test_encoded_fallback(self):
+        for vals in ([(1, 2), (0, 1)], [2**64, 1], ['a\x00', 'a'],
+                     [float('nan'), 1.0], [2**53 + 1, 0.5]):
+            stats = SortStats()
+            rows = [{'v': v} for v in vals]
+            rows_sorted = multisort(rows, 'v', engine='encoded', stats=stats)
+            self.assertEqual(stats.engine, 'compiled')
+            self.assertIn("'v'", stats.fallback)
+            self.assertEqual(rows_sorted, multisort(rows, 'v',
+                                                    engine='multipass'))
+
+        # None from clean is an error, as in the other engines
+        rows = [{'a': 'b'}, {'a': ''}, {'a': 'c'}, {'a': None}]
+        for default in (None, 'x'):
+            spec = [mscol('a', clean=lambda v: v or None, default=default)]
+            with self.assertRaises(MultiSortError):
+                multisort(rows, spec, engine='encoded')
+
+
+class AsyncTests(unittest.TestCase):
+    # AsyncTests.test_amultisort_matches_multisort
+    def test_amultisort_matches_multisort(self):
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                expected = multisort(STUDENTS_BASE, spec, reverse=reverse)
+                for (inline_rows, offload_rows) in ((100, 100), (0, 100),
+                                                    (0, 0)):
+                    for chunk_rows in (1, 4):
+                        self.assertEqual(asyncio.run(amultisort(
+                            iter(STUDENTS_BASE), spec, reverse=reverse,
+                            inline_rows=inline_rows,
+                            offload_rows=offload_rows,
+                            chunk_rows=chunk_rows)), expected)
+
+    # AsyncTests.test_amultisort_no_spec
+    def test_amultisort_no_spec(self):
+        # equal values of different types show the order of ties
+        rows = [1, 1.0, True, 0, 0.0, False]
+        for reverse in (False, True):
+            expected = multisort(rows, reverse=reverse)
+            for (inline_rows, offload_rows) in ((100, 100), (0, 100), (0, 0)):
+                for chunk_rows in (1, 4):
+                    rows_sorted = asyncio.run(amultisort(
+                        rows, reverse=reverse, inline_rows=inline_rows,
+                        offload_rows=offload_rows, chunk_rows=chunk_rows))
+                    self.assertEqual(list(map(type, rows_sorted)),
+                                     list(map(type, expected)))
+
+    # AsyncTests.test_amultisort_yields_and_errors
+    def test_amultisort_yields_and_errors(self):
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        async def run(rows, spec):
+            task = asyncio.ensure_future(ticker())
+            try:
+                return await amultisort(rows, spec, inline_rows=0,
+                                        chunk_rows=2)
+            finally:
+                task.cancel()
+
+        self.assertEqual(asyncio.run(run(STUDENTS_BASE, COL_NAME)),
+                         multisort(STUDENTS_BASE, COL_NAME))
+        self.assertGreater(len(ticks), 3)
+        with self.assertRaises(MultiSortError):
+            asyncio.run(run([{'grade': 'A'}, {}], 'grade'))
+
+
+class TopKTests(unittest.TestCase):
+    # TopKTests.test_topk_matches_multisort
+    def test_topk_matches_multisort(self):
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                full = list(multisort(STUDENTS_BASE, spec, reverse=reverse))
+                for k in range(0, len(STUDENTS_BASE) + 1):
+                    for offset in (0, 2):
+                        self.assertEqual(
+                            msort_topk(STUDENTS_BASE, spec, k, offset=offset,
+                                       reverse=reverse),
+                            full[offset:offset + k])
+
+    # TopKTests.test_topk_iterable
+    def test_topk_iterable(self):
+        spec = [mscol(COL_ATTEND, reverse=True)]
+        self.assertEqual(msort_topk(iter(STUDENTS_BASE), spec, 3),
+                         multisort(STUDENTS_BASE, spec)[:3])
+
+    # TopKTests.test_topk_error
+    def test_topk_error(self):
+        rows = [{'grade': 'A'}, {}]
+        for reverse in (False, True):
+            with self.assertRaises(MultiSortError):
+                msort_topk(rows, 'grade', 1, reverse=reverse)
+            with self.assertRaises(MultiSortError):
+                msort_topk(iter(rows), 'grade', 1, reverse=reverse)
+
+
+class ArgsortTests(unittest.TestCase):
+    # ArgsortTests.test_argsort_matches_multisort
+    def test_argsort_matches_multisort(self):
+        for engine in mst.ENGINES:
+            for (expected, spec) in MSORTED_TESTS:
+                for reverse in (False, True):
+                    order = multisort_argsort(STUDENTS_BASE, spec,
+                                              reverse=reverse, engine=engine)
+                    self.assertEqual(order.typecode, 'l')
+                    self.assertEqual(
+                        tuple(order),
+                        expected[::-1] if reverse else expected)
+
+    # ArgsortTests.test_argsort_error
+    def test_argsort_error(self):
+        with self.assertRaises(MultiSortError):
+            multisort_argsort([{'grade': 'A'}, {}], 'grade')
+
+    # ArgsortTests.test_apply_permutation
+    def test_apply_permutation(self):
+        order = multisort_argsort(STUDENTS_BASE, COL_NAME)
+        names = [row[COL_NAME] for row in STUDENTS_BASE]
+        attend = array('l', (row[COL_ATTEND] for row in STUDENTS_BASE))
+        (names_sorted, attend_sorted) = apply_permutation(order, names,
+                                                          attend)
+        self.assertEqual(names_sorted, sorted(names))
+        self.assertIsInstance(attend_sorted, array)
+        self.assertEqual(list(attend_sorted), [85, 85, 70, 55, 80, 100])
+
+        (names_inplace,) = apply_permutation(order, names, inplace=True)
+        self.assertIs(names_inplace, names)
+        self.assertEqual(names, names_sorted)
+
+    # ArgsortTests.test_argsort_numpy
+    @unittest.skipUnless(mst.np is not None, "requires numpy")
+    def test_argsort_numpy(self):
+        spec = MSORTED_TESTS[3][1]
+        order = multisort_argsort(STUDENTS_BASE, spec, as_numpy=True)
+        self.assertEqual(tuple(order), MSORTED_TESTS[3][0])
+        attend = mst.np.array([row[COL_ATTEND] for row in STUDENTS_BASE])
+        (attend_sorted,) = apply_permutation(order, attend)
+        self.assertEqual(attend_sorted.tolist(), [55, 85, 80, 70, 100, 85])
+
+
+class ColumnsTests(unittest.TestCase):
+    # ColumnsTests.test_columns_match_multisort
+    def test_columns_match_multisort(self):
+        cols = tuple(list(col) for col in zip(*STUDENTS_BASE))
+        cols_dict = dict(zip(STUDENT_COLS, cols))
+        for engine in mst.ENGINES:
+            for (expected, spec) in MSORTED_TESTS:
+                for reverse in (False, True):
+                    idxs = expected[::-1] if reverse else expected
+                    cols_sorted = multisort(Columns(cols), spec,
+                                            reverse=reverse, engine=engine)
+                    self.assertIsInstance(cols_sorted, tuple)
+                    self.assertEqual(tuple(cols_sorted[COL_IDX]), idxs)
+                    self.assertEqual(
+                        tuple(multisort_argsort(Columns(cols), spec,
+                                                reverse=reverse,
+                                                engine=engine)), idxs)
+
+            spec = [mscol('grade', reverse=True), 'attend']
+            cols_sorted = multisort(Columns(cols_dict), spec, engine=engine)
+            self.assertEqual(list(cols_sorted), STUDENT_COLS)
+            self.assertEqual(tuple(cols_sorted['idx']), (4, 0, 3, 5, 1, 2))
+
+    # ColumnsTests.test_columns_inplace_and_errors
+    def test_columns_inplace_and_errors(self):
+        cols = {'name': ['joe', 'dav', 'bob'], 'attend': [80, 85, 85]}
+        self.assertIs(multisort(Columns(cols), 'name', inplace=True), cols)
+        self.assertEqual(cols, {'name': ['bob', 'dav', 'joe'],
+                                'attend': [85, 85, 80]})
+        with self.assertRaises(MultiSortError):
+            multisort(Columns(cols), 'grade')
+        self.assertEqual(
+            multisort(Columns(cols), [mscol('grade', required=False),
+                                      mscol('attend', reverse=True)]),
+            {'name': ['bob', 'dav', 'joe'], 'attend': [85, 85, 80]})
+
+    # ColumnsTests.test_columns_numpy_arrays
+    @unittest.skipUnless(mst.np is not None, "requires numpy")
+    def test_columns_numpy_arrays(self):
+        np = mst.np
+        attend = np.array([row[COL_ATTEND] for row in STUDENTS_BASE],
+                          dtype=np.int16)
+        names = [row[COL_NAME] for row in STUDENTS_BASE]
+        stats = SortStats()
+        (attend_sorted, names_sorted) = multisort(
+            Columns((attend, names)), [(0, True), 1], engine='numpy',
+            stats=stats)
+        self.assertEqual(stats.engine, 'numpy')
+        self.assertEqual(attend_sorted.tolist(), [100, 85, 85, 80, 70, 55])
+        self.assertEqual(names_sorted, ['joh', 'bob', 'dav', 'joe', 'jan',
+                                        'jim'])
+
+
+@unittest.skipUnless(pa is not None, "requires pyarrow")
+class ArrowTests(unittest.TestCase):
+    # ArrowTests.test_arrow_matches_multisort
+    def test_arrow_matches_multisort(self):
+        cols = dict(zip(STUDENT_COLS, map(list, zip(*STUDENTS_BASE))))
+        for data in (pa.table(cols), pa.record_batch(cols)):
+            for (expected, spec) in MSORTED_TESTS:
+                spec = [spec] if isinstance(spec, int) else spec
+                for reverse in (False, True):
+                    idxs = list(expected[::-1] if reverse else expected)
+                    stats = SortStats()
+                    data_sorted = multisort(data, spec, reverse=reverse,
+                                            stats=stats)
+                    self.assertIs(type(data_sorted), type(data))
+                    self.assertEqual(data_sorted.column('idx').to_pylist(),
+                                     idxs)
+                    self.assertEqual(
+                        multisort_argsort(data, spec,
+                                          reverse=reverse).to_pylist(),
+                        idxs)
+                    clean = any(col[2] for col in spec
+                                if isinstance(col, (list, tuple))
+                                and len(col) > 2)
+                    self.assertEqual(stats.engine,
+                                     'dsu' if clean else 'arrow')
+                    self.assertEqual(stats.fallback is not None, clean)
+
+    # ArrowTests.test_arrow_defaults_paths_and_errors
+    def test_arrow_defaults_paths_and_errors(self):
+        data = pa.table({'c': [{'z': 2}, {'z': None}, None, {'z': 1}],
+                         'n': [1.5, None, 0.5, float('nan')]})
+        self.assertEqual(multisort_argsort(data, 'c.z').to_pylist(),
+                         [3, 0, 1, 2])
+        self.assertEqual(multisort_argsort(
+            data, [mscol('q', required=False),
+                   mscol(('c', 'z'), True, default=3)]).to_pylist(),
+            [1, 2, 0, 3])
+        stats = SortStats()
+        multisort(data, 'n', stats=stats)
+        self.assertEqual(stats.fallback, "NaN in column 'n'")
+        with self.assertRaises(MultiSortError):
+            multisort(data, 'q')
+
+    # ArrowTests.test_arrow_list_paths
+    def test_arrow_list_paths(self):
+        data = pa.table({'items': [[{'p': 2}], [{'p': 1}]]})
+        stats = SortStats()
+        self.assertEqual(multisort_argsort(data, 'items.0.p',
+                                           stats=stats).to_pylist(), [1, 0])
+        self.assertEqual(stats.engine, 'arrow')
+
+        data = pa.table({'items': [[{'p': 2}], [], None, [{'p': 1}]]})
+        spec = [mscol('items.0.p', required=False, default=5)]
+        rows_sorted = multisort(data.to_pylist(), spec)
+        self.assertEqual(multisort(data, spec, stats=stats).to_pylist(),
+                         rows_sorted)
+        self.assertEqual(stats.fallback, "path 'items.0.p' not resolved"
+                                         " by Arrow")
+        with self.assertRaises(MultiSortError):
+            multisort(data, 'items.0.p')
+        with self.assertRaises(AssertionError):
+            multisort(pa.array([3, 1]), 0)
+
+
+class ExternalSortTests(unittest.TestCase):
+    # ExternalSortTests.test_external_matches_multisort
+    def test_external_matches_multisort(self):
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                expected = list(multisort(STUDENTS_BASE, spec,
+                                          reverse=reverse))
+                for chunk_size in (1, 2, 4, 100):
+                    rows_sorted = multisort_external(
+                        iter(STUDENTS_BASE), spec, reverse=reverse,
+                        chunk_size=chunk_size, fan_in=2)
+                    self.assertEqual(list(rows_sorted), expected)
+
+    # ExternalSortTests.test_external_tmp_dir_cleanup
+    def test_external_tmp_dir_cleanup(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rows_sorted = multisort_external(STUDENTS_BASE, COL_NAME,
+                                             chunk_size=2, tmp_dir=tmp_dir)
+            self.assertEqual(next(rows_sorted)[COL_NAME], 'bob')
+            self.assertTrue(os.listdir(tmp_dir))
+            rows_sorted.close()
+            self.assertFalse(os.listdir(tmp_dir))
+
+
+class MergeTests(unittest.TestCase):
+    # MergeTests.test_merge_matches_multisort
+    def test_merge_matches_multisort(self):
+        shards = [STUDENTS_BASE[:2], STUDENTS_BASE[2:5], [],
+                  STUDENTS_BASE[5:]]
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                for validate in (False, True):
+                    inputs = [iter(multisort(rows, spec, reverse=reverse))
+                              for rows in shards]
+                    self.assertEqual(
+                        list(multisort_merge(*inputs, spec=spec,
+                                             reverse=reverse,
+                                             validate=validate)),
+                        multisort(STUDENTS_BASE, spec, reverse=reverse))
+
+    # MergeTests.test_merge_stable
+    def test_merge_stable(self):
+        rows_a = [{'k': 1, 'src': 'a'}, {'k': None, 'src': 'a'}]
+        rows_b = [{'k': 1, 'src': 'b'}, {'k': None, 'src': 'b'}]
+        rows_merged = list(multisort_merge(rows_a, rows_b, spec='k'))
+        self.assertEqual([(row['k'], row['src']) for row in rows_merged],
+                         [(1, 'a'), (1, 'b'), (None, 'a'), (None, 'b')])
+
+    # MergeTests.test_merge_validate
+    def test_merge_validate(self):
+        spec = [mscol(COL_GRADE, reverse=True), COL_ATTEND]
+        rows_sorted = multisort(STUDENTS_BASE, spec)
+        rows_bad = rows_sorted[:3] + [rows_sorted[4], rows_sorted[3]]
+        with self.assertRaises(MultiSortError) as cm:
+            list(multisort_merge(rows_sorted, rows_bad, spec=spec,
+                                 validate=True))
+        self.assertIs(cm.exception.row, rows_sorted[3])
+        self.assertIn('Input 1', str(cm.exception))
+
+    # MergeTests.test_merge_key_error
+    def test_merge_key_error(self):
+        with self.assertRaises(MultiSortError) as cm:
+            list(multisort_merge([{'grade': 'A'}], [{'attend': 1}],
+                                 spec=['grade']))
+        self.assertIn("'grade'", str(cm.exception))
+
+
+class ParallelTests(unittest.TestCase):
+    def setUp(self):
+        self._min_rows = mst.PARALLEL_MIN_ROWS
+        mst.PARALLEL_MIN_ROWS = 0
+
+    def tearDown(self):
+        mst.PARALLEL_MIN_ROWS = self._min_rows
+
+    # ParallelTests.test_parallel_matches_multisort
+    def test_parallel_matches_multisort(self):
+        for (_, spec) in MSORTED_TESTS:
+            for reverse in (False, True):
+                rows_sorted = multisort(STUDENTS_BASE, spec, reverse=reverse,
+                                        parallel=True, workers=2)
+                self.assertEqual(list(rows_sorted), list(multisort(
+                    STUDENTS_BASE, spec, reverse=reverse)))
+
+    # ParallelTests.test_parallel_rejects_unpicklable_spec
+    def test_parallel_rejects_unpicklable_spec(self):
+        spec = [mscol(COL_NAME, clean=lambda v: v.upper())]
+        with self.assertRaises(MultiSortError):
+            multisort(STUDENTS_BASE, spec, parallel=True, workers=2)
+
+    # ParallelTests.test_parallel_small_sort_in_process
+    def test_parallel_small_sort_in_process(self):
+        mst.PARALLEL_MIN_ROWS = len(STUDENTS_BASE) + 1
+        stats = SortStats()
+        multisort(STUDENTS_BASE, COL_NAME, parallel=True, workers=2,
+                  stats=stats)
+        self.assertEqual(stats.engine, 'compiled')
+        self.assertIn('PARALLEL_MIN_ROWS', stats.fallback)
+
+    # ParallelTests.test_parallel_iterable
+    def test_parallel_iterable(self):
+        expected = multisort(STUDENTS_BASE, COL_NAME)
+        for min_rows in (0, len(STUDENTS_BASE) + 1):
+            mst.PARALLEL_MIN_ROWS = min_rows
+            self.assertEqual(multisort(iter(STUDENTS_BASE), COL_NAME,
+                                       parallel=True, workers=2),
+                             expected)
+
+    # ParallelTests.test_parallel_threads
+    def test_parallel_threads(self):
+        gil_enabled = mst._gil_enabled
+        mst._gil_enabled = lambda: False
+        try:
+            for (_, spec) in MSORTED_TESTS + [
+                    ([], [mscol(COL_NAME, clean=lambda v: v.upper())])]:
+                for reverse in (False, True):
+                    stats = SortStats()
+                    rows_sorted = multisort(STUDENTS_BASE, spec,
+                                            reverse=reverse,
+                                            parallel='thread', workers=3,
+                                            stats=stats)
+                    self.assertEqual(stats.engine, 'parallel-threads')
+                    self.assertEqual(rows_sorted, multisort(
+                        STUDENTS_BASE, spec, reverse=reverse))
+        finally:
+            mst._gil_enabled = gil_enabled
+
+    # ParallelTests.test_parallel_threads_gil_fallback
+    def test_parallel_threads_gil_fallback(self):
+        gil_enabled = mst._gil_enabled
+        mst._gil_enabled = lambda: True
+        try:
+            stats = SortStats()
+            rows_sorted = multisort(STUDENTS_BASE, COL_NAME,
+                                    parallel='thread', workers=2,
+                                    stats=stats)
+            self.assertEqual(stats.engine, 'compiled')
+            self.assertIn('GIL', stats.fallback)
+            self.assertEqual(rows_sorted, multisort(STUDENTS_BASE, COL_NAME))
+        finally:
+            mst._gil_enabled = gil_enabled
+
+
+StudentNT = namedtuple('StudentNT', STUDENT_COLS)
+
+
+@dataclass
+class StudentDC:
+    idx: int
+    name: str
+    grade: str
+    attend: int
+
+
+class StudentSlots:
+    __slots__ = STUDENT_COLS
+
+    def __init__(self, idx, name, grade, attend):
+        (self.idx, self.name, self.grade, self.attend) = \
+            (idx, name, grade, attend)
+
+
+class RowShapeTests(unittest.TestCase):
+    def _check_shape(self, make_row):
+        rows_in = [make_row(*r) for r in STUDENTS_BASE]
+        dict_spec = [mscol('grade', reverse=True), mscol('attend')]
+        expected = [r[COL_IDX] for r in multisort(
+            STUDENTS_BASE, [mscol(COL_GRADE, reverse=True), COL_ATTEND])]
+        self.assertEqual([r.idx for r in multisort(rows_in, dict_spec)],
+                         expected)
+
+    # RowShapeTests.test_namedtuple
+    def test_namedtuple(self):
+        self._check_shape(StudentNT)
+
+    # RowShapeTests.test_dataclass
+    def test_dataclass(self):
+        self._check_shape(StudentDC)
+
+    # RowShapeTests.test_slots
+    def test_slots(self):
+        self._check_shape(StudentSlots)
+
+    # RowShapeTests.test_mixed_shapes
+    def test_mixed_shapes(self):
+        makers = (StudentNT, StudentDC, StudentSlots, Student)
+        self._check_shape(lambda *r: makers[r[COL_IDX] % len(makers)](*r))
+
+    # RowShapeTests.test_missing_attribute_error
+    def test_missing_attribute_error(self):
+        rows_in = [StudentSlots(*r) for r in STUDENTS_BASE]
+        with self.assertRaises(MultiSortError) as cm:
+            multisort(rows_in, 'missing')
+        self.assertIsInstance(cm.exception.cause, MSKeyError)
+
+
 def norm_spec_item(spec_c):
     if isinstance(spec_c, (int, str)):
         return (spec_c, False, None, None, True)